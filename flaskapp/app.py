@@ -1,158 +1,135 @@
-from flask import Flask, render_template, json, request, redirect, session, jsonify
-from flaskext.mysql import MySQL
-import pymysql
-import mysql.connector
+from flask import Flask
+import logging
 import os
 
-app = Flask(__name__)
-
-mysql = MySQL()
-
-# MySQL configurations
-app.config['MYSQL_DATABASE_USER'] = os.getenv('MYSQL_DATABASE_USER')
-app.config['MYSQL_DATABASE_PASSWORD'] = os.getenv('MYSQL_DATABASE_PASSWORD')
-app.config['MYSQL_DATABASE_DB'] = os.getenv('MYSQL_DATABASE_DB')
-app.config['MYSQL_DATABASE_HOST'] = os.getenv('MYSQL_DATABASE_HOST')
-
-
-mysql.init_app(app)
-
-# set a secret key for the session
-app.secret_key = 'why would I tell you my secret key?'
-
-@app.route("/flask")
-def main():
-    return render_template('index.html')
-
-
-@app.route('/showSignUp')
-def showSignUp():
-    return render_template('signup.html')
-
-@app.route('/signUp',methods=['POST','GET'])
-def signUp():
-    # read the posted values from the UI
-    _name = request.form['inputName']
-    _email = request.form['inputEmail']
-    _password = request.form['inputPassword']
-
-    # validate the received values
-    if _name and _email and _password:
-        conn = mysql.connect()
-        cursor = conn.cursor()
-
-        #_hash_password = generate_password_hash(_password) 
-
-        cursor.callproc('sp_createUser',(_name,_email,_password))
-
-        data = cursor.fetchall()
-
-        if len(data) == 0:
-            conn.commit()
-            return json.dumps({'message':'User created successfully !'})
-        else:
-            return json.dumps({'error':str(data[0])})  
-    else:
-        return json.dumps({'html':'<span>Enter the required fields</span>'})     
-
-
-@app.route('/showSignIn')
-def showSignin():
-    return render_template('signin.html')
-
-@app.route('/validateLogin',methods=['POST'])
-def validateLogin():
-    try:
-        _username = request.form['inputEmail']
-        _password = request.form['inputPassword']
-
-        con = mysql.connect()
-        cursor = con.cursor()
-        cursor.callproc('sp_validateLogin',(_username,))
-        data = cursor.fetchall()
-        if len(data) > 0:
-            if data[0][3]==_password:
-                session['user'] = data[0][0]
-                return redirect('/userHome')
-            else:
-                return render_template('error.html',error = 'Wrong Email address or Password')
-        else:
-            return render_template('error.html',error='Wrong Email address or Password')
-
-    except Exception as e:
-        return render_template('error.html',error=str(e))
-    finally:
-        cursor.close()
-        con.close()
-
-@app.route('/userHome')
-def userHome():
-    if session.get('user'):
-        return render_template('userHome.html')
-    else:
-        return render_template('error.html',error = 'Unauthorized Access')
-
-@app.route('/logout')
-def logout():
-    session.pop('user',None)
-    return redirect('/')
-
-@app.route('/showAddWish')
-def showAddWish():
-    return render_template('addWish.html')
-
-@app.route('/addWish',methods=['POST'])
-def addWish():
-    try:
-        if session.get('user'):
-            _title = request.form['inputTitle']
-            _description = request.form['inputDescription']
-            _user = session.get('user')
- 
-            conn = mysql.connect()
-            cursor = conn.cursor()
-            cursor.callproc('sp_addWish',(_title,_description,_user))
-            data = cursor.fetchall()
- 
-            if len(data) == 0:
-                conn.commit()
-                return redirect('/userHome')
-            else:
-                return render_template('error.html',error = 'An error occurred!')
- 
-        else:
-            return render_template('error.html',error = 'Unauthorized Access')
-    except Exception as e:
-        return render_template('error.html',error = str(e))
-    finally:
-        cursor.close()
-        conn.close()
-
-@app.route('/getWish')
-def getWish():
-    try:
-        if session.get('user'):
-            _user = session.get('user')
- 
-            con = mysql.connect()
-            cursor = con.cursor()
-            cursor.callproc('sp_GetWishByUser',(_user,))
-            wishes = cursor.fetchall()
- 
-            wishes_dict = []
-            for wish in wishes:
-                wish_dict = {
-                        'Id': wish[0],
-                        'Title': wish[1],
-                        'Description': wish[2],
-                        'Date': wish[4]}
-                wishes_dict.append(wish_dict)
- 
-            return json.dumps(wishes_dict)
-        else:
-            return render_template('error.html', error = 'Unauthorized Access')
-    except Exception as e:
-        return render_template('error.html', error = str(e))
+from db import mysql
+from fragment_cache import FragmentCache
+from json_provider import FastJSONProvider
+from sharding import ConnectionPool, ShardRouter, parse_shards, shards_cli
+from user_filter import UsernameFilter
+from wish_feed import WishFeed
+
+logger = logging.getLogger(__name__)
+
+
+def _env_flag(name, default):
+    return os.getenv(name, default).lower() == 'true'
+
+
+def config_from_env():
+    """Read the app configuration from the environment."""
+    return {
+        # set a secret key for the session
+        'SECRET_KEY': os.getenv('SECRET_KEY', 'why would I tell you my secret key?'),
+
+        # MySQL configurations
+        'MYSQL_DATABASE_DRIVER': os.getenv('MYSQL_DATABASE_DRIVER', 'flask-mysql'),
+        'MYSQL_DATABASE_USER': os.getenv('MYSQL_DATABASE_USER'),
+        'MYSQL_DATABASE_PASSWORD': os.getenv('MYSQL_DATABASE_PASSWORD'),
+        'MYSQL_DATABASE_DB': os.getenv('MYSQL_DATABASE_DB'),
+        'MYSQL_DATABASE_HOST': os.getenv('MYSQL_DATABASE_HOST'),
+
+        # Shard servers for tbl_user/tbl_wish as name=host[:port],...; the
+        # database above then only holds tbl_user_directory
+        'MYSQL_SHARDS': os.getenv('MYSQL_SHARDS', ''),
+        'MYSQL_SHARD_POOL_SIZE': int(os.getenv('MYSQL_SHARD_POOL_SIZE', '5')),
+        'MYSQL_SHARD_CACHE_SECONDS': float(os.getenv('MYSQL_SHARD_CACHE_SECONDS', '5')),
+
+        # Username Bloom filter configurations
+        'USER_FILTER_ENABLED': _env_flag('USER_FILTER_ENABLED', 'true'),
+        'USER_FILTER_ERROR_RATE': float(os.getenv('USER_FILTER_ERROR_RATE', '0.01')),
+        'USER_FILTER_REFRESH_SECONDS': float(
+            os.getenv('USER_FILTER_REFRESH_SECONDS', '5')),
+        'USER_FILTER_REBUILD_SECONDS': float(
+            os.getenv('USER_FILTER_REBUILD_SECONDS', '3600')),
+
+        # Server-side rendered first page of userHome
+        'USERHOME_SSR': _env_flag('USERHOME_SSR', 'true'),
+        'WISH_PAGE_SIZE': int(os.getenv('WISH_PAGE_SIZE', '20')),
+        'WISH_FRAGMENT_CACHE_SIZE': int(os.getenv('WISH_FRAGMENT_CACHE_SIZE', '1024')),
+        'WISH_FRAGMENT_CACHE_SECONDS': float(
+            os.getenv('WISH_FRAGMENT_CACHE_SECONDS', '300')),
+
+        # Server-Sent Events stream of new wishes
+        'WISH_STREAM_POLL_SECONDS': float(os.getenv('WISH_STREAM_POLL_SECONDS', '1')),
+        'WISH_STREAM_HEARTBEAT_SECONDS': float(
+            os.getenv('WISH_STREAM_HEARTBEAT_SECONDS', '15')),
+        'WISH_STREAM_QUEUE_SIZE': int(os.getenv('WISH_STREAM_QUEUE_SIZE', '100')),
+        'WISH_STREAM_BACKLOG': int(os.getenv('WISH_STREAM_BACKLOG', '1000')),
+
+        # Warm caches in every gunicorn worker before it takes requests,
+        # see warm_up() and gunicorn.conf.py
+        'WARMUP': _env_flag('WARMUP', 'false'),
+    }
+
+
+def warm_up(app):
+    """Pay the first-request costs of a worker up front.
+
+    Compiles every template into the Jinja cache, opens one connection
+    through the configured driver, fills every shard's connection pool
+    and starts building the username filter in the background. Failures
+    are logged; the worker then warms lazily as before. Called by
+    gunicorn's post_worker_init hook.
+    """
+    with app.app_context():
+        for name in app.jinja_env.list_templates(extensions=['html']):
+            app.jinja_env.get_template(name)
+        try:
+            mysql.connect().close()
+        except Exception:
+            logger.warning('warm-up could not connect to MySQL', exc_info=True)
+        router = app.extensions.get('shards')
+        for name, pool in (router.shards.items() if router else ()):
+            try:
+                pool.fill()
+            except Exception:
+                logger.warning('warm-up could not connect to shard %s', name,
+                               exc_info=True)
+        if app.config['USER_FILTER_ENABLED']:
+            app.extensions['user_filter'].start(app)
+
+
+def create_app(config=None):
+    """Create the Flask app; ``config`` overrides values read from the env."""
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.config.update(config_from_env())
+    if config:
+        app.config.update(config)
+
+    mysql.init_app(app)
+    shards = parse_shards(app.config['MYSQL_SHARDS'])
+    if shards:
+        driver = app.extensions['mysql']
+        app.extensions['shards'] = ShardRouter(
+            {name: ConnectionPool(driver.connect_to(host, port),
+                                  size=app.config['MYSQL_SHARD_POOL_SIZE'])
+             for name, host, port in shards},
+            mysql,
+            cache_ttl=app.config['MYSQL_SHARD_CACHE_SECONDS'])
+    app.extensions['user_filter'] = UsernameFilter(
+        mysql,
+        table='tbl_user_directory' if shards else 'tbl_user',
+        error_rate=app.config['USER_FILTER_ERROR_RATE'],
+        refresh_interval=app.config['USER_FILTER_REFRESH_SECONDS'],
+        rebuild_interval=app.config['USER_FILTER_REBUILD_SECONDS'])
+    app.extensions['wish_fragments'] = FragmentCache(
+        maxsize=app.config['WISH_FRAGMENT_CACHE_SIZE'],
+        ttl=app.config['WISH_FRAGMENT_CACHE_SECONDS'])
+    app.extensions['wish_feed'] = WishFeed(
+        app, mysql,
+        poll_interval=app.config['WISH_STREAM_POLL_SECONDS'],
+        queue_size=app.config['WISH_STREAM_QUEUE_SIZE'])
+
+    import auth
+    import wishes
+    app.register_blueprint(auth.bp)
+    app.register_blueprint(wishes.bp)
+    app.cli.add_command(shards_cli)
+
+    return app
+
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0",port=5002,debug=True)
+    create_app().run(host="0.0.0.0",port=5002,debug=True)
@@ -0,0 +1,137 @@
+from flask import (Blueprint, current_app, jsonify, redirect, render_template, request,
+                   session)
+import uuid
+
+from db import ER_SP_DOES_NOT_EXIST, error_code, mysql
+from sharding import connect_for_username
+
+bp = Blueprint('auth', __name__)
+
+
+def _user_filter():
+    user_filter = current_app.extensions['user_filter']
+    if current_app.config['USER_FILTER_ENABLED']:
+        user_filter.start(current_app._get_current_object())
+    return user_filter
+
+
+@bp.route("/flask")
+def main():
+    return render_template('index.html')
+
+
+@bp.route('/showSignUp')
+def showSignUp():
+    return render_template('signup.html')
+
+@bp.route('/signUp',methods=['POST','GET'])
+def signUp():
+    # read the posted values from the UI
+    _name = request.form['inputName']
+    _email = request.form['inputEmail']
+    _password = request.form['inputPassword']
+
+    # validate the received values
+    if _name and _email and _password:
+        router = current_app.extensions.get('shards')
+        if router is not None:
+            # The directory's unique index decides whether the name is taken
+            try:
+                user_id = router.create_user(_name,_email,_password)
+            except (mysql.Error, LookupError):
+                current_app.logger.warning('could not create user on its shard',
+                                           exc_info=True)
+                return jsonify(
+                    {'error':'Could not create the account, please try again'})
+            if user_id is None:
+                return jsonify({'error':str(('Username Exists !!',))})
+            _user_filter().add(_email)
+            return jsonify({'message':'User created successfully !'})
+
+        conn = mysql.connect()
+        cursor = conn.cursor()
+
+        #_hash_password = generate_password_hash(_password) 
+
+        data = None
+        if (current_app.config['USER_FILTER_ENABLED']
+                and not _user_filter().might_exist(_email)):
+            # Definitely a new username: skip the existence check and let
+            # the unique index reject the rare race with another signup.
+            try:
+                cursor.callproc('sp_insertUser',(_name,_email,_password))
+                data = cursor.fetchall()
+            except mysql.IntegrityError:
+                data = [('Username Exists !!',)]
+            except mysql.Error as e:
+                # A database initialised before sp_insertUser was added
+                # and not yet upgraded with mysql/upgrade.sql
+                if error_code(e) != ER_SP_DOES_NOT_EXIST:
+                    raise
+                current_app.logger.warning(
+                    'sp_insertUser is missing, run mysql/upgrade.sql')
+        if data is None:
+            cursor.callproc('sp_createUser',(_name,_email,_password))
+            data = cursor.fetchall()
+
+        if len(data) == 0:
+            conn.commit()
+            _user_filter().add(_email)
+            return jsonify({'message':'User created successfully !'})
+        else:
+            return jsonify({'error':str(data[0])})
+    else:
+        return jsonify({'html':'<span>Enter the required fields</span>'})
+
+
+@bp.route('/showSignIn')
+def showSignin():
+    return render_template('signin.html')
+
+@bp.route('/validateLogin',methods=['POST'])
+def validateLogin():
+    con = cursor = None
+    try:
+        _username = request.form['inputEmail']
+        _password = request.form['inputPassword']
+
+        if (current_app.config['USER_FILTER_ENABLED']
+                and not _user_filter().might_exist(_username)):
+            return render_template('error.html',error='Wrong Email address or Password')
+
+        con = connect_for_username(_username)
+        if con is None:
+            return render_template('error.html',error='Wrong Email address or Password')
+        cursor = con.cursor()
+        cursor.callproc('sp_validateLogin',(_username,))
+        data = cursor.fetchall()
+        if len(data) > 0:
+            if data[0][3]==_password:
+                session['user'] = data[0][0]
+                session['wish_version'] = uuid.uuid4().hex
+                return redirect('/userHome')
+            else:
+                return render_template('error.html',
+                                       error = 'Wrong Email address or Password')
+        else:
+            return render_template('error.html',error='Wrong Email address or Password')
+
+    except Exception as e:
+        return render_template('error.html',error=str(e))
+    finally:
+        if cursor is not None:
+            cursor.close()
+        if con is not None:
+            con.close()
+
+@bp.route('/userFilterStats')
+def userFilterStats():
+    if not session.get('user'):
+        return render_template('error.html',error = 'Unauthorized Access')
+    return jsonify(_user_filter().stats())
+
+@bp.route('/logout')
+def logout():
+    session.pop('user',None)
+    session.pop('wish_version',None)
+    return redirect('/')
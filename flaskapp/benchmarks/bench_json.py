@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Serialization micro-benchmarks for /getWish payloads.
+
+Compares the old dict-per-row + flask.json.dumps path with the
+FastJSONProvider on both the stdlib and the orjson encoder.
+
+Usage: python benchmarks/bench_json.py
+"""
+
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+import json_provider  # noqa: E402
+from wishes import Wish  # noqa: E402
+
+SIZES = [10, 1000, 100000]
+
+
+def make_rows(n):
+    start = datetime(2023, 1, 1)
+    return [
+        (i, 'Wish %d' % i, 'Description for wish %d' % i, 1, start + timedelta(minutes=i))
+        for i in range(n)
+    ]
+
+
+def legacy(provider, rows):
+    wishes_dict = []
+    for wish in rows:
+        wishes_dict.append({
+            'Id': wish[0],
+            'Title': wish[1],
+            'Description': wish[2],
+            'Date': wish[4]})
+    return provider.dumps(wishes_dict)
+
+
+def fast(provider, rows):
+    return provider.dumps_bytes([Wish.from_row(row) for row in rows])
+
+
+def bench(fn, provider, rows):
+    number = max(1, 100000 // len(rows))
+    best = min(timeit.repeat(lambda: fn(provider, rows), number=number, repeat=5))
+    return best / number
+
+
+def main():
+    app = Flask(__name__)
+    stdlib_default = DefaultJSONProvider(app)
+    fast_provider = json_provider.FastJSONProvider(app)
+    native = json_provider.orjson
+
+    print('%8s %16s %16s %16s' % ('rows', 'legacy (ms)', 'stdlib (ms)', 'orjson (ms)'))
+    for n in SIZES:
+        rows = make_rows(n)
+        old = bench(legacy, stdlib_default, rows)
+        json_provider.orjson = None
+        plain = bench(fast, fast_provider, rows)
+        json_provider.orjson = native
+        orj = bench(fast, fast_provider, rows) if native is not None else float('nan')
+        print('%8d %16.3f %16.3f %16.3f' % (n, old * 1e3, plain * 1e3, orj * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Write throughput of addWish-style requests against 1, 2, 4 and 8 shards.
+
+Client threads pick random users and write a wish through
+ShardRouter.connect(), so routing, the shard cache and the per-shard
+connection pools are all on the measured path.
+
+With MYSQL_SHARDS set (``name=host[:port],...``, as for the app) the
+loop runs against those MySQL servers, using the first 1, 2, 4, ... of
+them, with the credentials from MYSQL_DATABASE_USER/PASSWORD/DB. The
+rows it writes are titled ``bench_sharding`` and deleted after each
+run. Servers sharing one host or disk share its fsync budget, so give
+each its own for numbers that mean anything.
+
+Without MYSQL_SHARDS each shard is a stand-in server that commits one
+write at a time, ``service_ms`` each. Its scaling is linear by
+construction; it is only a smoke run of the routing and pooling code.
+
+Usage: python benchmarks/bench_sharding.py [threads] [service_ms] [seconds]
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sharding import ConnectionPool, ShardRouter, parse_shards  # noqa: E402
+
+SHARD_COUNTS = [1, 2, 4, 8]
+USERS = 10000
+TITLE = 'bench_sharding'
+
+
+class FakeShard:
+    """A server that commits one write at a time after ``service_time``."""
+
+    def __init__(self, service_time):
+        self.service_time = service_time
+        self.write_lock = threading.Lock()
+
+    def connect(self):
+        return self
+
+    def cursor(self):
+        return self
+
+    def callproc(self, name, args):
+        with self.write_lock:
+            time.sleep(self.service_time)
+
+    def execute(self, query, args=None):
+        pass
+
+    def fetchall(self):
+        return []
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        pass
+
+
+def run(pools, threads, seconds):
+    """Writes per second over ``pools``, and the least/most written shard ratio."""
+    router = ShardRouter(pools, directory=None, cache_ttl=3600, cache_size=USERS)
+    # Directory lookups are cached per worker; start from a warm cache
+    for user_id in range(1, USERS + 1):
+        router.cache.set(user_id, (router.place(user_id), False))
+
+    writes = dict.fromkeys(pools, 0)
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client():
+        rng = random.Random()
+        done = dict.fromkeys(pools, 0)
+        while time.monotonic() < deadline:
+            user_id = rng.randint(1, USERS)
+            conn = router.connect(user_id, write=True)
+            try:
+                cursor = conn.cursor()
+                cursor.callproc('sp_addWish', (TITLE, 'Description', user_id))
+                cursor.fetchall()
+                cursor.close()
+                conn.commit()
+            finally:
+                conn.close()
+            done[router.place(user_id)] += 1
+        with lock:
+            for name, count in done.items():
+                writes[name] += count
+
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    start = time.monotonic()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - start
+
+    for pool in pools.values():
+        conn = pool.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM tbl_wish WHERE wish_title = %s', (TITLE,))
+            cursor.close()
+            conn.commit()
+        finally:
+            conn.close()
+
+    counts = list(writes.values())
+    return sum(counts) / elapsed, min(counts) / max(max(counts), 1)
+
+
+def mysql_pools(shards, threads):
+    """Connection pools for the MYSQL_SHARDS servers, through the app's driver."""
+    from app import create_app
+
+    driver = create_app({'MYSQL_SHARDS': ''}).extensions['mysql']
+    return {name: ConnectionPool(driver.connect_to(host, port), size=threads)
+            for name, host, port in shards}
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    service_time = float(sys.argv[2]) / 1e3 if len(sys.argv) > 2 else 0.002
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 2.0
+    shards = parse_shards(os.getenv('MYSQL_SHARDS'))
+
+    if shards:
+        pools = mysql_pools(shards, threads)
+        names = [name for name, _, _ in shards]
+        counts = [n for n in SHARD_COUNTS if n < len(names)] + [len(names)]
+        print('MySQL shards: %s' % os.getenv('MYSQL_SHARDS'))
+        print('threads=%d duration=%.0fs' % (threads, seconds))
+    else:
+        names = ['shard%d' % i for i in range(max(SHARD_COUNTS))]
+        counts = SHARD_COUNTS
+        print('stand-in shards (smoke run, scales linearly by construction)')
+        print('threads=%d service=%.1fms duration=%.0fs'
+              % (threads, service_time * 1e3, seconds))
+
+    print('%6s %10s %8s %10s' % ('shards', 'writes/s', 'speedup', 'min/max'))
+    baseline = None
+    for count in counts:
+        if shards:
+            subset = {name: pools[name] for name in names[:count]}
+        else:
+            subset = {name: ConnectionPool(FakeShard(service_time).connect, size=threads)
+                      for name in names[:count]}
+        throughput, balance = run(subset, threads, seconds)
+        baseline = baseline or throughput
+        print('%6d %10.0f %7.2fx %10.2f'
+              % (count, throughput, throughput / baseline, balance))
+
+
+if __name__ == '__main__':
+    main()
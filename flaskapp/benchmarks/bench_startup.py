@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for the Flask application.
+
+Each sample runs in a fresh interpreter and measures:
+- import: ``import app``
+- boot: ``create_app()`` for the given driver
+- warm-up: ``warm_up(app)`` (templates; the filter is disabled and the MySQL
+  connection attempt is skipped so the numbers do not depend on a server)
+
+Usage: python benchmarks/bench_startup.py [samples]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DRIVERS = ['flask-mysql', 'pymysql', 'mysql-connector']
+
+SAMPLE = """
+import json, sys, time
+from unittest.mock import patch
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+flask_app = app.create_app({'MYSQL_DATABASE_DRIVER': %(driver)r,
+                            'USER_FILTER_ENABLED': False})
+t2 = time.perf_counter()
+with patch.object(app.mysql, 'connect', side_effect=OSError):
+    app.warm_up(flask_app)
+t3 = time.perf_counter()
+print(json.dumps({'import': t1 - t0, 'boot': t2 - t1, 'warm_up': t3 - t2,
+                  'modules': len(sys.modules)}))
+"""
+
+
+def sample(driver):
+    result = subprocess.run(
+        [sys.executable, '-c', SAMPLE % {'driver': driver}],
+        cwd=APP_DIR, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    print('%16s %12s %12s %12s %9s' % ('driver', 'import (ms)', 'boot (ms)',
+                                        'warm-up (ms)', 'modules'))
+    for driver in DRIVERS:
+        runs = [sample(driver) for _ in range(samples)]
+        print('%16s %12.1f %12.1f %12.1f %9d' % (
+            driver,
+            statistics.median(r['import'] for r in runs) * 1e3,
+            statistics.median(r['boot'] for r in runs) * 1e3,
+            statistics.median(r['warm_up'] for r in runs) * 1e3,
+            runs[-1]['modules']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Time-to-first-content and requests per page view for userHome.
+
+Replays what the browser does for one userHome view against the Flask
+test client, with MySQL replaced by a stand-in that sleeps for a fixed
+query latency. Network round trips are added arithmetically.
+
+- js: userHome HTML, then /getWish for the whole list
+- ssr (cold/warm): userHome HTML with the first page inlined, then one
+  /getWish?after=... request for the rest of the list, as getWish.js
+  does. "warm" is a repeat view served from the fragment cache.
+
+Usage: python benchmarks/bench_userhome.py [rtt_ms] [db_ms]
+"""
+
+import os
+import re
+import sys
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from db import mysql  # noqa: E402
+
+SIZES = [5, 20, 100, 1000]
+PAGE_SIZE = 20
+
+
+class FakeDB:
+    """Answers the wish procedures from memory after ``latency`` seconds."""
+
+    def __init__(self, count, latency):
+        self.rows = [(i, 'Wish %d' % i, 'Description of wish %d' % i, 1, None)
+                     for i in range(1, count + 1)]
+        self.latency = latency
+        self.result = []
+
+    def connect(self):
+        return self
+
+    def cursor(self):
+        return self
+
+    def callproc(self, name, args):
+        time.sleep(self.latency)
+        if name == 'sp_GetWishByUserPage':
+            _, after, limit = args
+            self.result = [r for r in self.rows if r[0] > after][:limit]
+        else:
+            self.result = self.rows
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+def timed_get(client, url):
+    start = time.perf_counter()
+    response = client.get(url)
+    return response, time.perf_counter() - start
+
+
+def page_view(client, ssr, rtt):
+    """Return (time to first content, time to full list, request count)."""
+    response, elapsed = timed_get(client, '/userHome')
+    total = rtt + elapsed
+    requests = 1
+    if not ssr:
+        response, elapsed = timed_get(client, '/getWish')
+        total += rtt + elapsed
+        return total, total, requests + 1
+
+    first = total
+    match = re.search(rb'data-next-after="(\d*)"', response.data)
+    if match and match.group(1):
+        response, elapsed = timed_get(client, '/getWish?after=%s' % match.group(1).decode())
+        total += rtt + elapsed
+        requests += 1
+    return first, total, requests
+
+
+def main():
+    rtt = float(sys.argv[1]) / 1e3 if len(sys.argv) > 1 else 0.030
+    db_latency = float(sys.argv[2]) / 1e3 if len(sys.argv) > 2 else 0.002
+
+    print('rtt=%.0fms db=%.0fms page_size=%d' % (rtt * 1e3, db_latency * 1e3, PAGE_SIZE))
+    print('%6s %9s %12s %12s %9s' % ('wishes', 'mode', 'first (ms)', 'full (ms)', 'requests'))
+    for count in SIZES:
+        fake = FakeDB(count, db_latency)
+        for mode in ('js', 'ssr-cold', 'ssr-warm'):
+            ssr = mode != 'js'
+            app = create_app({'USERHOME_SSR': ssr, 'USER_FILTER_ENABLED': False,
+                              'WISH_PAGE_SIZE': PAGE_SIZE})
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['user'] = 1
+                sess['wish_version'] = 'bench'
+            with patch.object(mysql, 'connect', fake.connect):
+                if mode == 'ssr-warm':
+                    page_view(client, ssr, rtt)
+                first, full, requests = page_view(client, ssr, rtt)
+            print('%6d %9s %12.1f %12.1f %9d' % (count, mode, first * 1e3, full * 1e3, requests))
+
+
+if __name__ == '__main__':
+    main()
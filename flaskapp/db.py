@@ -0,0 +1,125 @@
+"""
+MySQL access for the Flask application.
+
+The driver package is imported when the app is created, and only the
+one named by MYSQL_DATABASE_DRIVER:
+
+- ``flask-mysql`` (default): flaskext.mysql on top of PyMySQL
+- ``pymysql``: PyMySQL directly
+- ``mysql-connector``: mysql.connector
+"""
+
+import importlib
+
+from flask import current_app
+
+DRIVERS = ('flask-mysql', 'pymysql', 'mysql-connector')
+
+# MySQL server error numbers
+ER_SP_DOES_NOT_EXIST = 1305
+
+
+def error_code(error):
+    """The MySQL error number carried by a driver exception, if any."""
+    code = getattr(error, 'errno', None)
+    if code is None and error.args:
+        code = error.args[0]
+    return code
+
+
+class _Driver:
+    """The imported driver module and connect functions bound to the config."""
+
+    def __init__(self, module, connect, connect_to, streaming_cursor):
+        self.module = module
+        self.connect = connect
+        self.connect_to = connect_to
+        self.streaming_cursor = streaming_cursor
+
+
+def _pymysql_args(config, host=None, port=None):
+    args = {
+        'host': host or config['MYSQL_DATABASE_HOST'],
+        'port': port or config['MYSQL_DATABASE_PORT'],
+        'user': config['MYSQL_DATABASE_USER'],
+        'password': config['MYSQL_DATABASE_PASSWORD'],
+        'db': config['MYSQL_DATABASE_DB'],
+        'charset': config['MYSQL_DATABASE_CHARSET'],
+    }
+    return {key: value for key, value in args.items() if value}
+
+
+def _load_driver(app):
+    name = app.config['MYSQL_DATABASE_DRIVER']
+    config = app.config
+
+    if name in ('flask-mysql', 'pymysql'):
+        pymysql = importlib.import_module('pymysql')
+
+        def connect_to(host=None, port=None):
+            args = _pymysql_args(config, host, port)
+            return lambda: pymysql.connect(**args)
+
+        if name == 'flask-mysql':
+            from flaskext.mysql import MySQL as FlaskMySQL
+            connect = FlaskMySQL(app).connect
+        else:
+            connect = connect_to()
+        return _Driver(pymysql, connect, connect_to,
+                       lambda conn: conn.cursor(pymysql.cursors.SSCursor))
+
+    if name == 'mysql-connector':
+        connector = importlib.import_module('mysql.connector')
+
+        def connect_to(host=None, port=None):
+            args = _pymysql_args(config, host, port)
+            if 'db' in args:
+                args['database'] = args.pop('db')
+            return lambda: connector.connect(**args)
+
+        # mysql.connector cursors are unbuffered unless asked otherwise
+        return _Driver(connector, connect_to(), connect_to,
+                       lambda conn: conn.cursor())
+
+    raise ValueError('Unknown MYSQL_DATABASE_DRIVER %r, expected one of %s'
+                     % (name, ', '.join(DRIVERS)))
+
+
+class MySQL:
+    """Per-app MySQL connections through the configured driver."""
+
+    def init_app(self, app):
+        app.config.setdefault('MYSQL_DATABASE_DRIVER', 'flask-mysql')
+        app.config.setdefault('MYSQL_DATABASE_HOST', 'localhost')
+        app.config.setdefault('MYSQL_DATABASE_PORT', 3306)
+        app.config.setdefault('MYSQL_DATABASE_USER', None)
+        app.config.setdefault('MYSQL_DATABASE_PASSWORD', None)
+        app.config.setdefault('MYSQL_DATABASE_DB', None)
+        app.config.setdefault('MYSQL_DATABASE_CHARSET', 'utf8')
+        app.extensions['mysql'] = _load_driver(app)
+
+    @property
+    def driver(self):
+        return current_app.extensions['mysql']
+
+    def connect(self):
+        return self.driver.connect()
+
+    def connect_to(self, host, port=None):
+        """A connect function for another server with the same credentials."""
+        return self.driver.connect_to(host, port)
+
+    def streaming_cursor(self, conn):
+        """A cursor that fetches rows from the server as they are read."""
+        return self.driver.streaming_cursor(conn)
+
+    @property
+    def Error(self):
+        return self.driver.module.Error
+
+    @property
+    def IntegrityError(self):
+        return self.driver.module.IntegrityError
+
+
+mysql = MySQL()
@@ -0,0 +1,27 @@
+"""
+Per-user cache of rendered HTML fragments.
+
+userHome stores the rendered first page of a user's wish list here, and
+/getWish the rest of the list. Keys start with ``(user_id, version)``
+where the version lives in the user's session and is replaced whenever
+the user adds a wish. The session cookie travels with the user, so a
+replica that missed the invalidation still misses its stale entry after
+the version changes. Entries also expire
+after ``ttl`` seconds to bound staleness for changes made from another
+browser.
+"""
+
+from ttl_cache import TTLCache
+
+
+class FragmentCache(TTLCache):
+    """A TTLCache whose keys start with a user id.
+
+    invalidate() takes a user id and drops every entry for that user.
+    """
+
+    def invalidate(self, user_id):
+        """Drop every cached version for ``user_id``."""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == user_id]:
+                del self.entries[key]
@@ -0,0 +1,14 @@
+"""
+gunicorn settings for the Flask app.
+
+With WARMUP=true every worker runs app.warm_up() once it has loaded the
+app and before it accepts its first request, with or without --preload.
+"""
+
+
+def post_worker_init(worker):
+    from app import warm_up
+
+    app = worker.wsgi
+    if app.config.get('WARMUP'):
+        warm_up(app)
@@ -0,0 +1,85 @@
+"""
+JSON provider for the Flask application.
+
+Uses orjson when it is installed and falls back to the stdlib json
+module otherwise. Both paths produce the same output for the types the
+app returns: datetimes are written as ISO 8601 strings and dataclass
+rows are written as objects.
+"""
+
+import dataclasses
+from datetime import date
+from functools import lru_cache
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+@lru_cache(maxsize=None)
+def _field_names(cls):
+    return tuple(f.name for f in dataclasses.fields(cls))
+
+
+def _iso_default(o):
+    """Serialize datetimes and dataclasses the way orjson does.
+
+    Dataclasses are flattened one level at a time instead of through
+    dataclasses.asdict, which deep-copies every value. Anything else is
+    deferred to Flask's default.
+    """
+    if isinstance(o, date):
+        return o.isoformat()
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return {name: getattr(o, name) for name in _field_names(type(o))}
+    return DefaultJSONProvider.default(o)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider that prefers orjson over the stdlib encoder."""
+
+    default = staticmethod(_iso_default)
+
+    # Rows are dataclasses with a fixed field order, so sorting keys only
+    # costs time without making the output any more stable.
+    sort_keys = False
+
+    # orjson always writes UTF-8; keep the stdlib fallback identical.
+    ensure_ascii = False
+
+    @property
+    def native(self):
+        """Whether the orjson encoder is in use."""
+        return orjson is not None
+
+    def dumps_bytes(self, obj, indent=False):
+        """Serialize ``obj`` to UTF-8 encoded JSON bytes."""
+        if orjson is not None:
+            option = orjson.OPT_NON_STR_KEYS
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(obj, default=self.default, option=option)
+        if indent:
+            return super().dumps(obj, indent=2).encode("utf-8")
+        return super().dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return self.dumps_bytes(obj).decode("utf-8")
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(
+            self.dumps_bytes(obj, indent=indent) + b"\n", mimetype=self.mimetype
+        )
+
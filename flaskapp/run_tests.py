@@ -22,6 +22,14 @@ def run_tests():
         "tests/",
         "-v",
         "--cov=app",
+        "--cov=auth",
+        "--cov=wishes",
+        "--cov=db",
+        "--cov=json_provider",
+        "--cov=user_filter",
+        "--cov=fragment_cache",
+        "--cov=wish_feed",
+        "--cov=sharding",
         "--cov-report=html",
         "--cov-report=term-missing",
         "--cov-fail-under=80",
@@ -0,0 +1,645 @@
+"""
+Horizontal sharding of tbl_user and tbl_wish across MySQL servers.
+
+Sharding is off unless MYSQL_SHARDS lists the shard servers, e.g.
+``shard0=db-0.db-service,shard1=db-1.db-service:3306``. Each user and
+all of their wishes live on one shard; the primary database
+(MYSQL_DATABASE_HOST) only keeps tbl_user_directory, which maps every
+username to its global user_id and current shard.
+
+- New users get their user_id from the directory and are placed on the
+  shard picked by a consistent hash ring of that id, so adding a shard
+  only moves about 1/N of the users.
+- Login looks the username up in the directory, then checks the
+  password on the user's shard. Every other request only carries the
+  user_id from the session, whose shard is cached per worker for
+  MYSQL_SHARD_CACHE_SECONDS.
+- Every shard has its own pool of open connections.
+- ``flask shards move-user`` and ``flask shards rebalance`` move users
+  between shards while the app keeps serving them, see move_user().
+  ``flask shards repair`` unlocks users left behind by an interrupted
+  move.
+- ``flask shards backfill`` registers the users of a database that was
+  in use before sharding was turned on, see backfill_directory().
+
+Wish ids must be unique across shards for moves and for the wish feed.
+Give every shard its own ``auto_increment_offset`` with a shared
+``auto_increment_increment`` larger than the number of shards.
+"""
+
+import bisect
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from db import mysql
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class UserMoving(Exception):
+    """Raised for writes to a user whose rows are being moved."""
+
+    def __init__(self, user_id):
+        super().__init__(
+            'Your wishes are being moved, please try again in a few seconds')
+        self.user_id = user_id
+
+
+def parse_shards(spec):
+    """Parse ``name=host[:port],...`` into ``[(name, host, port), ...]``."""
+    shards = []
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, sep, address = item.partition('=')
+        if not sep or not name or not address:
+            raise ValueError(
+                'Bad MYSQL_SHARDS entry %r, expected name=host[:port]' % item)
+        host, _, port = address.partition(':')
+        shards.append((name.strip(), host.strip(), int(port) if port else None))
+    if len({name for name, _, _ in shards}) != len(shards):
+        raise ValueError('Duplicate shard name in MYSQL_SHARDS %r' % spec)
+    return shards
+
+
+def _hash(key):
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class HashRing:
+    """Consistent hash ring with ``vnodes`` points per node."""
+
+    def __init__(self, nodes, vnodes=128):
+        points = sorted((_hash('%s#%d' % (node, i)), node)
+                        for node in nodes for i in range(vnodes))
+        if not points:
+            raise ValueError('A hash ring needs at least one node')
+        self.nodes = list(nodes)
+        self.hashes = [h for h, _ in points]
+        self.owners = [node for _, node in points]
+
+    def node(self, key):
+        """The node owning ``key``: the first point clockwise of its hash."""
+        i = bisect.bisect(self.hashes, _hash(str(key)))
+        return self.owners[i % len(self.owners)]
+
+
+class PooledConnection:
+    """A pooled DB-API connection whose close() returns it to the pool."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise AttributeError('connection was returned to the pool')
+        return getattr(self._conn, name)
+
+
+class ConnectionPool:
+    """Keeps up to ``size`` idle connections to one server.
+
+    connect() reuses the most recently returned connection, so idle
+    ones are the first to time out server side; a burst beyond ``size``
+    opens extra connections that are closed when returned. Connections
+    are rolled back on return, and any that fail to roll back are
+    dropped. A connection idle for more than ``ping_after`` seconds is
+    pinged before it is handed out, and one idle for more than
+    ``max_idle`` seconds is closed instead, so a connection closed by
+    the server's wait_timeout never reaches a request. A forked worker
+    starts with an empty pool rather than sharing the parent's sockets.
+    """
+
+    def __init__(self, connect, size=5, ping_after=1.0, max_idle=300.0):
+        self._connect = connect
+        self.size = size
+        self.ping_after = ping_after
+        self.max_idle = max_idle
+        self.idle = []
+        self.pid = None
+        self.opened = 0
+        self.reused = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def connect(self):
+        while True:
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.pid = os.getpid()
+                    self.idle = []
+                if not self.idle:
+                    break
+                conn, released = self.idle.pop()
+            if self._alive(conn, time.monotonic() - released):
+                self.reused += 1
+                return PooledConnection(self, conn)
+            self.dropped += 1
+            self._discard(conn)
+        conn = self._connect()
+        self.opened += 1
+        return PooledConnection(self, conn)
+
+    def fill(self):
+        """Open connections until ``size`` of them are idle."""
+        conns = []
+        try:
+            for _ in range(self.size):
+                conns.append(self.connect())
+        finally:
+            for conn in conns:
+                conn.close()
+
+    def _alive(self, conn, idle_for):
+        if idle_for > self.max_idle:
+            return False
+        if idle_for > self.ping_after:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    def release(self, conn):
+        try:
+            conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append((conn, time.monotonic()))
+                return
+        self._discard(conn)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        return {'idle': len(self.idle), 'opened': self.opened, 'reused': self.reused,
+                'dropped': self.dropped}
+
+
+class ShardRouter:
+    """Maps users to shards and hands out connections to them.
+
+    ``shards`` maps shard names to objects with ``connect()``, usually
+    ConnectionPools; ``directory`` provides ``connect()`` to the
+    database holding tbl_user_directory. Only the names in ``shards``
+    take part in the hash ring; ``ring`` may be passed to override it.
+    """
+
+    def __init__(self, shards, directory, cache_ttl=5.0, cache_size=65536, ring=None):
+        self.shards = dict(shards)
+        self.directory = directory
+        self.cache_ttl = cache_ttl
+        self.ring = ring or HashRing(sorted(self.shards))
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+
+    def place(self, user_id):
+        """The shard a user belongs on according to the hash ring."""
+        return self.ring.node(user_id)
+
+    def _query_directory(self, query, args):
+        conn = self.directory.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, args)
+            row = cursor.fetchone()
+            cursor.close()
+            return row
+        finally:
+            conn.close()
+
+    def lookup(self, user_id):
+        """``(shard, moving)`` for a user, from the cache when fresh."""
+        entry = self.cache.get(user_id)
+        if entry is None:
+            entry = self._query_directory(
+                'SELECT shard, moving FROM tbl_user_directory WHERE user_id = %s',
+                (user_id,))
+            if entry is None:
+                raise LookupError('User %s is not in tbl_user_directory' % user_id)
+            entry = (entry[0], bool(entry[1]))
+            self.cache.set(user_id, entry)
+        return entry
+
+    def locate(self, username):
+        """The user_id registered for ``username``, or None."""
+        row = self._query_directory(
+            'SELECT user_id, shard, moving FROM tbl_user_directory '
+            'WHERE user_username = %s', (username,))
+        if row is None:
+            return None
+        self.cache.set(row[0], (row[1], bool(row[2])))
+        return row[0]
+
+    def connect(self, user_id, write=False):
+        """A connection to the user's shard.
+
+        Writes are refused with UserMoving while the user is being
+        moved; reads keep going to the source shard until the move
+        completes.
+        """
+        shard, moving = self.lookup(user_id)
+        if write and moving:
+            raise UserMoving(user_id)
+        if shard not in self.shards:
+            raise LookupError('User %s is on unknown shard %r' % (user_id, shard))
+        return self.shards[shard].connect()
+
+    def create_user(self, name, username, password):
+        """Register a user on its shard; returns the user_id, or None if taken.
+
+        The directory row is held uncommitted while the shard row is
+        written, so the username stays locked against concurrent signups
+        and a failed shard write leaves nothing behind.
+        """
+        directory = self.directory.connect()
+        try:
+            cursor = directory.cursor()
+            try:
+                cursor.execute(
+                    'INSERT INTO tbl_user_directory (user_username, shard, moving) '
+                    'VALUES (%s, %s, 1)', (username, ''))
+            except mysql.IntegrityError:
+                return None
+            user_id = cursor.lastrowid
+            shard = self.place(user_id)
+            cursor.execute(
+                'UPDATE tbl_user_directory SET shard = %s, moving = 0 '
+                'WHERE user_id = %s', (shard, user_id))
+
+            conn = self.shards[shard].connect()
+            try:
+                shard_cursor = conn.cursor()
+                shard_cursor.execute(
+                    'INSERT INTO tbl_user '
+                    '(user_id, user_name, user_username, user_password) '
+                    'VALUES (%s, %s, %s, %s)', (user_id, name, username, password))
+                conn.commit()
+                shard_cursor.close()
+            finally:
+                conn.close()
+
+            try:
+                directory.commit()
+            except Exception:
+                self._delete_rows(shard, [user_id])
+                raise
+            cursor.close()
+        finally:
+            directory.close()
+        self.cache.set(user_id, (shard, False))
+        return user_id
+
+    def _delete_rows(self, shard, user_ids):
+        conn = self.shards[shard].connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM tbl_wish WHERE wish_user_id IN (%s)'
+                           % _placeholders(user_ids), tuple(user_ids))
+            cursor.execute('DELETE FROM tbl_user WHERE user_id IN (%s)'
+                           % _placeholders(user_ids), tuple(user_ids))
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+
+    def _update_directory(self, query, args):
+        conn = self.directory.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, args)
+            conn.commit()
+            count = cursor.rowcount
+            cursor.close()
+        finally:
+            conn.close()
+        return count
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def connect_for_user(user_id, write=False):
+    """A connection to the database holding ``user_id``'s rows."""
+    router = current_app.extensions.get('shards')
+    if router is None:
+        return mysql.connect()
+    return router.connect(user_id, write)
+
+
+def connect_for_username(username):
+    """A connection to the database holding ``username``, or None if unknown."""
+    router = current_app.extensions.get('shards')
+    if router is None:
+        return mysql.connect()
+    user_id = router.locate(username)
+    if user_id is None:
+        return None
+    return router.connect(user_id)
+
+
+def _copy_rows(source, target, user_id):
+    """Copy a user's tbl_user and tbl_wish rows, keeping their ids."""
+    conn = source.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM tbl_user WHERE user_id = %s', (user_id,))
+        users = cursor.fetchall()
+        cursor.execute('SELECT * FROM tbl_wish WHERE wish_user_id = %s', (user_id,))
+        wishes = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+
+    conn = target.connect()
+    try:
+        cursor = conn.cursor()
+        # Leftovers of an earlier, interrupted move are replaced
+        cursor.execute('DELETE FROM tbl_wish WHERE wish_user_id = %s', (user_id,))
+        cursor.execute('DELETE FROM tbl_user WHERE user_id = %s', (user_id,))
+        for table, rows in (('tbl_user', users), ('tbl_wish', wishes)):
+            if rows:
+                cursor.executemany(
+                    'INSERT INTO %s VALUES (%s)' % (table, _placeholders(rows[0])),
+                    [tuple(row) for row in rows])
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+    return len(users), len(wishes)
+
+
+def move_users(router, moves, wait=None, progress=None):
+    """Move users' rows between shards while the app is live.
+
+    ``moves`` is a list of ``(user_id, target_shard)``. The whole batch
+    goes through each step together, so the cache TTL is waited out
+    twice per batch rather than twice per user:
+
+    1. Mark the users as moving and wait for every worker's shard cache
+       to expire, after which all writes for them are refused.
+    2. Copy each user's tbl_user and tbl_wish rows to its target shard.
+    3. Point the directory at the targets and clear the marks, then wait
+       out the cache again so no worker still reads from the sources.
+    4. Delete the rows from the source shards.
+
+    Reads are served from the source shards throughout. A user whose
+    copy fails stays on its source shard and is writable again after
+    step 3. ``wait`` defaults to the router's cache TTL; ``progress`` is
+    called with ``(copied, total)`` after each copy.
+
+    Returns ``(moved, failed)``: ``{user_id: (user_rows, wish_rows)}``
+    and ``{user_id: exception}``.
+    """
+    wait = router.cache_ttl if wait is None else wait
+    batch = []
+    for user_id, target in moves:
+        if target not in router.shards:
+            raise LookupError('Unknown shard %r' % target)
+        router.cache.invalidate(user_id)
+        source, _ = router.lookup(user_id)
+        if source != target:
+            batch.append((user_id, source, target))
+    if not batch:
+        return {}, {}
+
+    user_ids = [user_id for user_id, _, _ in batch]
+    moved, failed = {}, {}
+    router._update_directory(
+        'UPDATE tbl_user_directory SET moving = 1 WHERE user_id IN (%s)'
+        % _placeholders(user_ids), tuple(user_ids))
+    try:
+        for user_id in user_ids:
+            router.cache.invalidate(user_id)
+        time.sleep(wait)
+
+        for user_id, source, target in batch:
+            try:
+                moved[user_id] = _copy_rows(
+                    router.shards[source], router.shards[target], user_id)
+            except Exception as e:
+                logger.warning('could not copy user %s to %s', user_id, target,
+                               exc_info=True)
+                failed[user_id] = e
+            if progress is not None:
+                progress(len(moved) + len(failed), len(batch))
+
+        for target in {target for _, _, target in batch}:
+            ids = [user_id for user_id, _, t in batch
+                   if t == target and user_id in moved]
+            if ids:
+                router._update_directory(
+                    'UPDATE tbl_user_directory SET shard = %%s, moving = 0 '
+                    'WHERE user_id IN (%s)' % _placeholders(ids),
+                    (target,) + tuple(ids))
+    finally:
+        # Users not flipped above stay where they were
+        unmoved = [user_id for user_id in user_ids if user_id not in moved]
+        if unmoved:
+            router._update_directory(
+                'UPDATE tbl_user_directory SET moving = 0 WHERE user_id IN (%s)'
+                % _placeholders(unmoved), tuple(unmoved))
+        for user_id in user_ids:
+            router.cache.invalidate(user_id)
+
+    time.sleep(wait)
+    for source in {source for _, source, _ in batch}:
+        ids = [user_id for user_id, s, _ in batch if s == source and user_id in moved]
+        if ids:
+            router._delete_rows(source, ids)
+    for user_id, source, target in batch:
+        if user_id in moved:
+            logger.info('moved user %s from %s to %s', user_id, source, target)
+    return moved, failed
+
+
+def move_user(router, user_id, target, wait=None):
+    """Move one user's rows to the ``target`` shard, see move_users().
+
+    Returns the number of rows copied as ``(users, wishes)``.
+    """
+    moved, failed = move_users(router, [(user_id, target)], wait)
+    if user_id in failed:
+        raise failed[user_id]
+    return moved.get(user_id, (0, 0))
+
+
+def misplaced_users(router):
+    """``(user_id, shard)`` for every user not on the shard the ring picks.
+
+    Users still marked as moving by an interrupted move are included, so
+    a rebalance picks their moves up again.
+    """
+    conn = router.directory.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT user_id, shard FROM tbl_user_directory')
+        misplaced = [(user_id, shard) for user_id, shard in cursor.fetchall()
+                     if shard != router.place(user_id)]
+        cursor.close()
+    finally:
+        conn.close()
+    return misplaced
+
+
+def clear_moving(router):
+    """Make users left marked as moving by an interrupted move writable.
+
+    Their rows are still read from the shard the directory names, so
+    this is safe as long as no move is running. Returns the number of
+    users cleared.
+    """
+    return router._update_directory(
+        'UPDATE tbl_user_directory SET moving = 0 WHERE moving = 1', ())
+
+
+def backfill_directory(router, batch_size=1000):
+    """Register every shard user that has no tbl_user_directory row.
+
+    For databases that held users before sharding was turned on. Users
+    are registered on the shard whose tbl_user holds them, which need
+    not be the one the ring picks; a rebalance moves them afterwards.
+    Unregistered users found on more than one shard are left out.
+
+    Returns ``(added, conflicts)``: the number of rows written and
+    ``[(user_id, [shard, ...]), ...]``.
+    """
+    conn = router.directory.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT user_id FROM tbl_user_directory')
+        known = {user_id for (user_id,) in cursor.fetchall()}
+        cursor.close()
+    finally:
+        conn.close()
+
+    found = {}
+    for shard in sorted(router.shards):
+        conn = router.shards[shard].connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT user_id, user_username FROM tbl_user')
+            for user_id, username in cursor.fetchall():
+                if user_id not in known:
+                    found.setdefault(user_id, []).append((username, shard))
+            cursor.close()
+        finally:
+            conn.close()
+
+    rows = [(user_id, places[0][0], places[0][1])
+            for user_id, places in sorted(found.items()) if len(places) == 1]
+    conflicts = [(user_id, [shard for _, shard in places])
+                 for user_id, places in sorted(found.items()) if len(places) > 1]
+    for start in range(0, len(rows), batch_size):
+        conn = router.directory.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany(
+                'INSERT INTO tbl_user_directory (user_id, user_username, shard) '
+                'VALUES (%s, %s, %s)', rows[start:start + batch_size])
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+    return len(rows), conflicts
+
+
+shards_cli = AppGroup('shards', help='Inspect and move users between MySQL shards.')
+
+
+def _router():
+    router = current_app.extensions.get('shards')
+    if router is None:
+        raise click.UsageError('Sharding is not enabled, set MYSQL_SHARDS.')
+    return router
+
+
+@shards_cli.command('move-user')
+@click.argument('user_id', type=int)
+@click.argument('shard')
+def move_user_command(user_id, shard):
+    """Move USER_ID and their wishes to SHARD."""
+    users, wishes = move_user(_router(), user_id, shard)
+    click.echo('moved user %d to %s (%d user rows, %d wishes)'
+               % (user_id, shard, users, wishes))
+
+
+@shards_cli.command('rebalance')
+@click.option('--dry-run', is_flag=True, help='Only list the users that would move.')
+@click.option('--batch-size', default=500, show_default=True,
+              help='Users moved together, sharing one wait for the shard caches.')
+def rebalance_command(dry_run, batch_size):
+    """Move every user to the shard the hash ring places them on.
+
+    Run after adding a shard to MYSQL_SHARDS on every replica.
+    """
+    router = _router()
+    moves = [(user_id, router.place(user_id)) for user_id, _ in misplaced_users(router)]
+    if dry_run:
+        for user_id, target in moves:
+            click.echo('%d -> %s' % (user_id, target))
+        return
+
+    click.echo('%d users to move in batches of %d' % (len(moves), batch_size))
+    done = failures = 0
+    for start in range(0, len(moves), batch_size):
+        batch = moves[start:start + batch_size]
+        click.echo('batch of %d: waiting %.0fs for shard caches, twice'
+                   % (len(batch), router.cache_ttl))
+        moved, failed = move_users(router, batch)
+        done += len(batch)
+        failures += len(failed)
+        for user_id, error in failed.items():
+            click.echo('user %d not moved: %s' % (user_id, error), err=True)
+        click.echo('%d/%d users processed, %d failed' % (done, len(moves), failures))
+    if failures:
+        raise click.ClickException(
+            '%d users were not moved; run rebalance again' % failures)
+
+
+@shards_cli.command('backfill')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Directory rows written per transaction.')
+def backfill_command(batch_size):
+    """Register the users created before sharding in the directory.
+
+    Run once after setting MYSQL_SHARDS and before the app takes
+    signups, then run rebalance.
+    """
+    added, conflicts = backfill_directory(_router(), batch_size)
+    for user_id, shards in conflicts:
+        click.echo('user %d is on %s, not registered' % (user_id, ', '.join(shards)),
+                   err=True)
+    click.echo('%d users added to tbl_user_directory' % added)
+    if conflicts:
+        raise click.ClickException(
+            '%d users are on more than one shard' % len(conflicts))
+
+
+@shards_cli.command('repair')
+def repair_command():
+    """Unlock users left marked as moving by an interrupted move.
+
+    Only run while no move-user or rebalance is in progress.
+    """
+    click.echo('%d users writable again' % clear_moving(_router()))
@@ -1,26 +1,82 @@
 $(function() {
+        var jumbotron = $('.jumbotron');
+        var div = $('<div>')
+            .attr('class', 'list-group')
+            .append($('<a>')
+                .attr('class', 'list-group-item active')
+                .append($('<h4>')
+                    .attr('class', 'list-group-item-heading'),
+                    $('<p>')
+                    .attr('class', 'list-group-item-text')));
+        var lastId = 0;
+        // Ids already on the page, so a wish sent twice is shown once
+        var rendered = {};
+
+        jumbotron.find('.list-group').each(function() {
+            rendered[$(this).data('id')] = true;
+            lastId = Math.max(lastId, $(this).data('id'));
+        });
+
+        var appendWishes = function(wishObj) {
+            var wish = '';
+
+            $.each(wishObj, function(index, value) {
+                if (rendered[value.Id]) {
+                    return;
+                }
+                rendered[value.Id] = true;
+                wish = $(div).clone().attr('data-id', value.Id);
+                $(wish).find('h4').text(value.Title);
+                $(wish).find('p').text(value.Description);
+                jumbotron.append(wish);
+                lastId = Math.max(lastId, value.Id);
+            });
+        };
+
+        // Once the list is complete, receive new wishes as they are added
+        var streamWishes = function() {
+            if (!window.EventSource) {
+                return;
+            }
+            var source = new EventSource('/wishes/stream?lastEventId=' + lastId);
+            source.addEventListener('wish', function(e) {
+                appendWishes([JSON.parse(e.data)]);
+            });
+        };
+
+        // The server rendered the first page: fetch the rest in one request
+        var loadRest = function(after) {
+            $.ajax({
+                url: '/getWish',
+                type: 'GET',
+                dataType: 'json',
+                data: { after: after },
+                success: function(res) {
+                    appendWishes(res);
+                    streamWishes();
+                },
+                error: function(error) {
+                    console.log(error);
+                }
+            });
+        };
+
+        if (jumbotron.data('rendered')) {
+            if (jumbotron.data('next-after')) {
+                loadRest(jumbotron.data('next-after'));
+            } else {
+                streamWishes();
+            }
+            return;
+        }
+
         $.ajax({
             url: '/getWish',
             type: 'GET',
+            dataType: 'json',
             success: function(res) {
-                var div = $('<div>')
-                    .attr('class', 'list-group')
-                    .append($('<a>')
-                        .attr('class', 'list-group-item active')
-                        .append($('<h4>')
-                            .attr('class', 'list-group-item-heading'),
-                            $('<p>')
-                            .attr('class', 'list-group-item-text')));
-                var wishObj = JSON.parse(res);
-
-                var wish = '';
- 
-                $.each(wishObj, function(index, value) {
-                    wish = $(div).clone();
-                    $(wish).find('h4').text(value.Title);
-                    $(wish).find('p').text(value.Description);
-                    $('.jumbotron').append(wish);
-                });
+                appendWishes(res);
+                streamWishes();
             },
             error: function(error) {
                 console.log(error);
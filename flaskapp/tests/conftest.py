@@ -1,21 +1,165 @@
 import pytest
-from app import app as flask_app
+from app import create_app
+import itertools
 import os
 import json
+import sqlite3
+from pymysql import IntegrityError
+
+# The tables of mysql/BucketList.sql, in SQLite
+SCHEMA = """
+CREATE TABLE tbl_user (
+  user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_name TEXT,
+  user_username TEXT UNIQUE,
+  user_password TEXT);
+CREATE TABLE tbl_wish (
+  wish_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  wish_title TEXT,
+  wish_description TEXT,
+  wish_user_id INTEGER,
+  wish_date TEXT);
+CREATE TABLE tbl_user_directory (
+  user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_username TEXT NOT NULL UNIQUE,
+  shard TEXT NOT NULL,
+  moving INTEGER NOT NULL DEFAULT 0);
+INSERT INTO sqlite_sequence (name, seq) VALUES ('tbl_user_directory', 999);
+"""
+
+
+class FakeMySQL:
+    """A MySQL server stand-in holding the app's tables in SQLite.
+
+    Queries run as written, with ``%s`` swapped for SQLite's ``?``, so
+    tests check table contents instead of matching SQL text. Writes are
+    applied on commit, a duplicate key raises pymysql's IntegrityError,
+    and stored procedures are not available. ``queries`` records every
+    ``(query, args)`` run through a cursor. Also stands in for db.MySQL
+    where only connect() and streaming_cursor() are used.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connections = 0
+        self.queries = []
+        conn = sqlite3.connect(path)
+        conn.executescript(SCHEMA)
+        conn.close()
+
+    def connect(self):
+        self.connections += 1
+        return FakeConnection(self)
+
+    def streaming_cursor(self, conn):
+        return conn.cursor()
+
+    def execute(self, query, args=()):
+        """Run one write on a fresh connection and commit it."""
+        self.executemany(query, [args])
+
+    def executemany(self, query, rows):
+        conn = FakeConnection(self)
+        conn.cursor().executemany(query, rows)
+        conn.commit()
+        conn.close()
+
+    def rows(self, query, args=()):
+        conn = FakeConnection(self)
+        cursor = conn.cursor()
+        cursor.execute(query, args)
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+
+    def table(self, name):
+        """``{primary key: row}`` for every row of table ``name``."""
+        return {row[0]: row for row in self.rows('SELECT * FROM %s' % name)}
+
+
+class FakeConnection:
+    """A DB-API connection to a FakeMySQL; ``closed`` fails the next ping."""
+
+    def __init__(self, server):
+        self.server = server
+        self.conn = sqlite3.connect(server.path, timeout=1, check_same_thread=False)
+        self.closed = False
+
+    def cursor(self, *args):
+        return FakeCursor(self.server, self.conn.cursor())
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def ping(self, reconnect=False):
+        if self.closed:
+            raise ConnectionError('MySQL server has gone away')
+
+    def close(self):
+        self.closed = True
+        self.conn.close()
+
+
+class FakeCursor:
+
+    def __init__(self, server, cursor):
+        self.server = server
+        self.cursor = cursor
+        self.lastrowid = None
+        self.rowcount = -1
+
+    def execute(self, query, args=()):
+        self.server.queries.append((query, args))
+        try:
+            self.cursor.execute(query.replace('%s', '?'), tuple(args or ()))
+        except sqlite3.IntegrityError as e:
+            raise IntegrityError(1062, str(e))
+        self.lastrowid = self.cursor.lastrowid
+        self.rowcount = self.cursor.rowcount
+
+    def executemany(self, query, rows):
+        try:
+            self.cursor.executemany(query.replace('%s', '?'), [tuple(row) for row in rows])
+        except sqlite3.IntegrityError as e:
+            raise IntegrityError(1062, str(e))
+        self.rowcount = self.cursor.rowcount
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchmany(self, size):
+        return self.cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def close(self):
+        self.cursor.close()
+
 
 @pytest.fixture
 def app():
     """Create and configure a new app instance for each test."""
-    # Configure the app for testing
-    flask_app.config['TESTING'] = True
-    flask_app.config['WTF_CSRF_ENABLED'] = False
-    
-    # Set test database configuration
-    flask_app.config['MYSQL_DATABASE_USER'] = 'test_user'
-    flask_app.config['MYSQL_DATABASE_PASSWORD'] = 'test_password'
-    flask_app.config['MYSQL_DATABASE_DB'] = 'test_db'
-    flask_app.config['MYSQL_DATABASE_HOST'] = 'localhost'
-    
+    flask_app = create_app({
+        # Configure the app for testing
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+
+        # Set test database configuration
+        'MYSQL_DATABASE_USER': 'test_user',
+        'MYSQL_DATABASE_PASSWORD': 'test_password',
+        'MYSQL_DATABASE_DB': 'test_db',
+        'MYSQL_DATABASE_HOST': 'localhost',
+
+        # Route every lookup to the (mocked) database by default
+        'USER_FILTER_ENABLED': False,
+        'USERHOME_SSR': False,
+        'WARMUP': False,
+    })
+
     yield flask_app
 
 @pytest.fixture
@@ -28,6 +172,12 @@ def runner(app):
     """A test runner for the app's Click commands."""
     return app.test_cli_runner()
 
+@pytest.fixture
+def fake_mysql(tmp_path):
+    """Factory for empty FakeMySQL servers."""
+    count = itertools.count()
+    return lambda: FakeMySQL(str(tmp_path / ('mysql%d.db' % next(count))))
+
 @pytest.fixture
 def mock_db(mocker):
     """Mock database connection and cursor."""
@@ -0,0 +1,106 @@
+import pytest
+import importlib.util
+import os
+import subprocess
+import sys
+from unittest.mock import patch, MagicMock
+
+from app import create_app, warm_up
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def imported_drivers(code):
+    """Run ``code`` in a fresh interpreter and list the driver modules it loaded."""
+    script = code + (
+        "\nimport sys"
+        "\nprint(','.join(m for m in ('flaskext.mysql', 'pymysql', 'mysql.connector')"
+        " if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', script], cwd=APP_DIR,
+                            capture_output=True, text=True, check=True)
+    return [m for m in result.stdout.strip().split(',') if m]
+
+
+class TestAppFactory:
+    """Test the create_app factory."""
+
+    def test_import_loads_no_driver(self):
+        """Test importing the app module does not import any MySQL driver."""
+        assert imported_drivers('import app') == []
+
+    @pytest.mark.parametrize('driver, modules', [
+        ('flask-mysql', ['flaskext.mysql', 'pymysql']),
+        ('pymysql', ['pymysql']),
+        ('mysql-connector', ['mysql.connector']),
+    ])
+    def test_only_configured_driver_imported(self, driver, modules):
+        """Test create_app imports just the configured driver."""
+        code = "import app; app.create_app({'MYSQL_DATABASE_DRIVER': %r})" % driver
+        assert imported_drivers(code) == modules
+
+    def test_unknown_driver(self):
+        """Test an unknown driver name is rejected at creation."""
+        with pytest.raises(ValueError):
+            create_app({'MYSQL_DATABASE_DRIVER': 'sqlite'})
+
+    def test_config_is_per_instance(self):
+        """Test two apps keep independent configuration."""
+        first = create_app({'MYSQL_DATABASE_DB': 'first', 'USER_FILTER_ENABLED': False})
+        second = create_app({'MYSQL_DATABASE_DB': 'second'})
+        assert first.config['MYSQL_DATABASE_DB'] == 'first'
+        assert second.config['MYSQL_DATABASE_DB'] == 'second'
+        assert first.extensions['user_filter'] is not second.extensions['user_filter']
+
+    def test_blueprints_registered(self, app):
+        """Test each subsystem is registered as its own blueprint."""
+        assert set(app.blueprints) == {'auth', 'wishes'}
+
+
+class TestWarmUp:
+    """Test the optional per-worker warm-up."""
+
+    @patch('app.mysql.connect')
+    def test_warm_up(self, mock_connect, app):
+        """Test warm-up compiles templates, connects and builds the filter."""
+        app.config['USER_FILTER_ENABLED'] = True
+        user_filter = MagicMock()
+        app.extensions['user_filter'] = user_filter
+
+        warm_up(app)
+
+        assert any(name == 'userHome.html' for _, name in app.jinja_env.cache.keys())
+        mock_connect.return_value.close.assert_called_once()
+        # The filter is built in the background, not inline
+        user_filter.start.assert_called_once_with(app)
+        user_filter.sync.assert_not_called()
+
+    @patch('app.mysql.connect')
+    def test_warm_up_survives_db_outage(self, mock_connect, app):
+        """Test a failed connection does not stop the worker from booting."""
+        mock_connect.side_effect = Exception('Database connection failed')
+        warm_up(app)
+
+    @patch('app.mysql.connect')
+    def test_warm_up_fills_shard_pools(self, mock_connect, app):
+        """Test warm-up fills every shard pool and survives a shard outage."""
+        up, down = MagicMock(), MagicMock()
+        down.fill.side_effect = OSError('shard down')
+        app.extensions['shards'] = MagicMock(shards={'s0': up, 's1': down})
+
+        warm_up(app)
+
+        up.fill.assert_called_once_with()
+        down.fill.assert_called_once_with()
+
+    @pytest.mark.parametrize('enabled', [True, False])
+    @patch('app.warm_up')
+    def test_gunicorn_post_worker_init(self, mock_warm_up, enabled):
+        """Test the gunicorn hook warms each worker only when WARMUP is set."""
+        spec = importlib.util.spec_from_file_location(
+            'gunicorn_conf', os.path.join(APP_DIR, 'gunicorn.conf.py'))
+        gunicorn_conf = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(gunicorn_conf)
+        app = create_app({'WARMUP': enabled, 'USER_FILTER_ENABLED': False})
+
+        gunicorn_conf.post_worker_init(MagicMock(wsgi=app))
+        assert mock_warm_up.called == enabled
@@ -0,0 +1,77 @@
+import pytest
+import json
+from datetime import datetime
+from unittest.mock import patch, MagicMock
+
+import json_provider
+from wishes import Wish
+
+ROWS = [
+    (1, 'Test Wish 1', 'Description 1', 1, datetime(2023, 1, 1, 10, 30)),
+    (2, 'Wünsch 2', 'Description 2', 1, datetime(2023, 1, 2, 8, 0, 0, 5000)),
+]
+
+
+@pytest.fixture(params=['native', 'stdlib'])
+def encoder(request, monkeypatch):
+    """Run a test against both the orjson and the stdlib encoder."""
+    if request.param == 'native':
+        if json_provider.orjson is None:
+            pytest.skip('orjson is not installed')
+    else:
+        monkeypatch.setattr(json_provider, 'orjson', None)
+    return request.param
+
+
+class TestJSONProvider:
+    """Test the application JSON provider."""
+
+    def test_wish_rows_serialize_as_objects(self, app, encoder):
+        """Test wish rows keep the shape getWish.js expects."""
+        data = json.loads(app.json.dumps([Wish.from_row(row) for row in ROWS]))
+        assert data == [
+            {'Id': 1, 'Title': 'Test Wish 1', 'Description': 'Description 1',
+             'Date': '2023-01-01T10:30:00'},
+            {'Id': 2, 'Title': 'Wünsch 2', 'Description': 'Description 2',
+             'Date': '2023-01-02T08:00:00.005000'},
+        ]
+
+    def test_encoders_agree(self, app, monkeypatch):
+        """Test the orjson and stdlib paths produce identical bytes."""
+        if json_provider.orjson is None:
+            pytest.skip('orjson is not installed')
+        obj = {'wishes': [Wish.from_row(row) for row in ROWS], 'count': 2}
+        native = app.json.dumps_bytes(obj)
+        monkeypatch.setattr(json_provider, 'orjson', None)
+        assert app.json.dumps_bytes(obj) == native
+
+    def test_loads_round_trip(self, app, encoder):
+        """Test loads accepts both text and bytes."""
+        assert app.json.loads('{"a": [1, 2]}') == {'a': [1, 2]}
+        assert app.json.loads(b'[true, null]') == [True, None]
+
+    @patch('app.mysql.connect')
+    def test_get_wish_content_type(self, mock_connect, client, encoder):
+        """Test getWish returns an application/json response."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = ROWS
+        mock_connect.return_value.cursor.return_value = mock_cursor
+
+        with client.session_transaction() as sess:
+            sess['user'] = 1
+
+        response = client.get('/getWish')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/json'
+        assert response.get_json()[1]['Date'] == '2023-01-02T08:00:00.005000'
+
+    @patch('app.mysql.connect')
+    def test_signup_content_type(self, mock_connect, client, sample_user_data):
+        """Test signUp returns an application/json response."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = []
+        mock_connect.return_value.cursor.return_value = mock_cursor
+
+        response = client.post('/signUp', data=sample_user_data)
+        assert response.mimetype == 'application/json'
+        assert response.get_json() == {'message': 'User created successfully !'}
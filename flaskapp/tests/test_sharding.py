@@ -0,0 +1,420 @@
+import pytest
+from collections import Counter
+from pymysql import IntegrityError
+from unittest.mock import MagicMock
+
+import sharding
+from sharding import (ConnectionPool, HashRing, ShardRouter, UserMoving,
+                      misplaced_users, move_user, move_users, parse_shards)
+
+
+@pytest.fixture
+def cluster(app, fake_mysql):
+    """A directory server and three shards behind a ShardRouter."""
+    servers = {name: fake_mysql() for name in ('shard0', 'shard1', 'shard2')}
+    directory = fake_mysql()
+    router = ShardRouter({name: ConnectionPool(server.connect, size=2)
+                          for name, server in servers.items()},
+                         directory, cache_ttl=60)
+    with app.app_context():
+        yield router, directory, servers
+
+
+def add_wishes(server, *wishes):
+    """Insert ``(wish_id, user_id)`` wishes on ``server``."""
+    server.executemany('INSERT INTO tbl_wish VALUES (%s, %s, %s, %s, %s)',
+                       [(wish_id, 'Wish %d' % wish_id, 'Description', user_id, None)
+                        for wish_id, user_id in wishes])
+
+
+def users(server):
+    return server.table('tbl_user')
+
+
+def directory_row(directory, user_id):
+    return directory.table('tbl_user_directory')[user_id]
+
+
+class TestHashRing:
+    """Test consistent placement of user ids."""
+
+    def test_spreads_users_evenly(self):
+        """Test every node gets a fair share of the keys."""
+        ring = HashRing(['a', 'b', 'c', 'd'])
+        counts = Counter(ring.node(user_id) for user_id in range(20000))
+        assert set(counts) == {'a', 'b', 'c', 'd'}
+        assert min(counts.values()) > 20000 / 4 * 0.75
+
+    def test_adding_a_node_moves_a_fraction(self):
+        """Test only the keys taken over by the new node change owner."""
+        before, after = HashRing(['a', 'b', 'c']), HashRing(['a', 'b', 'c', 'd'])
+        moved = [k for k in range(20000) if before.node(k) != after.node(k)]
+        assert all(after.node(k) == 'd' for k in moved)
+        assert 0.15 < len(moved) / 20000 < 0.35
+
+    def test_needs_a_node(self):
+        with pytest.raises(ValueError):
+            HashRing([])
+
+
+class TestParseShards:
+    """Test the MYSQL_SHARDS format."""
+
+    def test_parse(self):
+        assert parse_shards('s0=db-0.db-service, s1=db-1:3307') == [
+            ('s0', 'db-0.db-service', None), ('s1', 'db-1', 3307)]
+        assert parse_shards('') == []
+
+    @pytest.mark.parametrize('spec', ['db-0', 's0=', 's0=a,s0=b'])
+    def test_rejects_bad_entries(self, spec):
+        with pytest.raises(ValueError):
+            parse_shards(spec)
+
+
+class TestConnectionPool:
+    """Test reuse and cleanup of pooled connections."""
+
+    def test_reuses_returned_connections(self, fake_mysql):
+        """Test a closed connection is rolled back and handed out again."""
+        server = fake_mysql()
+        pool = ConnectionPool(server.connect, size=1)
+        first = pool.connect()
+        raw = first._conn
+        first.close()
+        first.close()
+        second = pool.connect()
+        assert second._conn is raw and server.connections == 1
+        assert pool.stats() == {'idle': 0, 'opened': 1, 'reused': 1, 'dropped': 0}
+
+    def test_pings_idle_connections(self, fake_mysql):
+        """Test a connection the server closed while idle is replaced."""
+        server = fake_mysql()
+        pool = ConnectionPool(server.connect, ping_after=0)
+        first = pool.connect()
+        raw = first._conn
+        first.close()
+        raw.closed = True  # wait_timeout
+        second = pool.connect()
+        assert second._conn is not raw and server.connections == 2
+        assert pool.stats()['dropped'] == 1
+
+    def test_drops_long_idle_connections(self, fake_mysql):
+        """Test connections idle beyond max_idle are closed, not pinged."""
+        server = fake_mysql()
+        pool = ConnectionPool(server.connect, max_idle=0)
+        first = pool.connect()
+        raw = first._conn
+        first.close()
+        assert pool.connect()._conn is not raw and raw.closed
+
+    def test_keeps_at_most_size_idle(self, fake_mysql):
+        """Test connections beyond the pool size are closed on return."""
+        pool = ConnectionPool(fake_mysql().connect, size=1)
+        a, b = pool.connect(), pool.connect()
+        raw_b = b._conn
+        a.close()
+        b.close()
+        assert len(pool.idle) == 1 and raw_b.closed
+
+    def test_fill(self, fake_mysql):
+        """Test fill() opens connections up to the pool size, once."""
+        server = fake_mysql()
+        pool = ConnectionPool(server.connect, size=3)
+        pool.connect().close()
+        pool.fill()
+        pool.fill()
+        assert len(pool.idle) == 3 and server.connections == 3
+
+    def test_drops_broken_connections(self):
+        """Test a connection that fails to roll back is not reused."""
+        conn = MagicMock()
+        conn.rollback.side_effect = OSError('gone')
+        pool = ConnectionPool(lambda: conn)
+        pool.connect().close()
+        assert pool.idle == [] and conn.close.called
+
+
+class TestShardRouter:
+    """Test user placement and lookups through the directory."""
+
+    def test_create_user_on_ring_shard(self, cluster):
+        """Test a signup lands on the shard the ring picks for its id."""
+        router, directory, servers = cluster
+        user_id = router.create_user('Ann', 'ann@example.com', 'pw')
+        shard = router.place(user_id)
+        assert directory_row(directory, user_id) == (user_id, 'ann@example.com', shard, 0)
+        assert users(servers[shard])[user_id] == (user_id, 'Ann', 'ann@example.com', 'pw')
+        assert sum(len(users(s)) for s in servers.values()) == 1
+
+    def test_create_user_taken(self, cluster):
+        """Test a duplicate username is refused by the directory."""
+        router, _, servers = cluster
+        router.create_user('Ann', 'ann@example.com', 'pw')
+        assert router.create_user('Ann', 'ann@example.com', 'pw') is None
+        assert sum(len(users(s)) for s in servers.values()) == 1
+
+    def test_create_user_shard_failure(self, cluster):
+        """Test a failed shard write leaves no directory row behind."""
+        router, directory, servers = cluster
+        for pool in router.shards.values():
+            pool._connect = MagicMock(side_effect=OSError('shard down'))
+        with pytest.raises(OSError):
+            router.create_user('Ann', 'ann@example.com', 'pw')
+        assert directory.table('tbl_user_directory') == {}
+
+    def test_locate_and_connect(self, cluster):
+        """Test login finds the user's shard from the username."""
+        router, _, servers = cluster
+        user_id = router.create_user('Ann', 'ann@example.com', 'pw')
+        router.cache.invalidate(user_id)
+        assert router.locate('ann@example.com') == user_id
+        assert router.locate('bob@example.com') is None
+        conn = router.connect(user_id)
+        assert conn.server is servers[router.place(user_id)]
+
+    def test_unknown_user(self, cluster):
+        router = cluster[0]
+        with pytest.raises(LookupError):
+            router.connect(42)
+
+    def test_spreads_signups(self, cluster):
+        """Test signups are spread over every shard."""
+        router, _, servers = cluster
+        for i in range(300):
+            router.create_user('User', 'user%d@example.com' % i, 'pw')
+        assert all(len(users(server)) > 50 for server in servers.values())
+
+
+class TestMoveUser:
+    """Test online moves between shards."""
+
+    def test_move_user(self, cluster):
+        """Test a move copies the rows, flips the directory and cleans up."""
+        router, directory, servers = cluster
+        user_id = router.create_user('Ann', 'ann@example.com', 'pw')
+        source = router.place(user_id)
+        target = next(name for name in servers if name != source)
+        add_wishes(servers[source], (3, user_id), (67, user_id), (5, user_id + 1))
+
+        assert move_user(router, user_id, target, wait=0) == (1, 2)
+        assert directory_row(directory, user_id)[2:] == (target, 0)
+        assert users(servers[target])[user_id][2] == 'ann@example.com'
+        assert sorted(servers[target].table('tbl_wish')) == [3, 67]
+        assert user_id not in users(servers[source])
+        assert list(servers[source].table('tbl_wish')) == [5]
+        assert router.connect(user_id, write=True).server is servers[target]
+
+    def test_writes_refused_while_moving(self, cluster, monkeypatch):
+        """Test reads stay on the source and writes fail during the copy."""
+        router, _, servers = cluster
+        user_id = router.create_user('Ann', 'ann@example.com', 'pw')
+        source = router.place(user_id)
+        target = next(name for name in servers if name != source)
+        seen = {}
+
+        def copy(src, dst, uid):
+            seen['read'] = router.connect(uid).server
+            with pytest.raises(UserMoving):
+                router.connect(uid, write=True)
+            return 1, 0
+        monkeypatch.setattr('sharding._copy_rows', copy)
+
+        move_user(router, user_id, target, wait=0)
+        assert seen['read'] is servers[source]
+
+    def test_failed_copy_clears_mark(self, cluster, monkeypatch):
+        """Test a failed copy leaves the user writable on the source shard."""
+        router, directory, servers = cluster
+        user_id = router.create_user('Ann', 'ann@example.com', 'pw')
+        source = router.place(user_id)
+        target = next(name for name in servers if name != source)
+        monkeypatch.setattr('sharding._copy_rows', MagicMock(side_effect=OSError('down')))
+
+        with pytest.raises(OSError):
+            move_user(router, user_id, target, wait=0)
+        assert directory_row(directory, user_id)[2:] == (source, 0)
+        assert user_id in users(servers[source])
+
+    def test_rebalance_after_adding_a_shard(self, cluster, app, fake_mysql):
+        """Test only users the ring now places on the new shard are misplaced."""
+        router, directory, servers = cluster
+        ids = [router.create_user('User', 'u%d@example.com' % i, 'pw') for i in range(200)]
+        servers['shard3'] = fake_mysql()
+        grown = ShardRouter({name: ConnectionPool(s.connect) for name, s in servers.items()},
+                            directory, cache_ttl=60)
+
+        misplaced = misplaced_users(grown)
+        assert 0 < len(misplaced) < len(ids)
+        assert all(grown.place(user_id) == 'shard3' for user_id, _ in misplaced)
+
+        for user_id, _ in misplaced:
+            move_user(grown, user_id, 'shard3', wait=0)
+        assert misplaced_users(grown) == []
+        assert len(users(servers['shard3'])) == len(misplaced)
+
+    def test_move_batch_waits_once(self, cluster, monkeypatch):
+        """Test a batch shares its cache waits and keeps failed users in place."""
+        router, directory, servers = cluster
+        ids = [router.create_user('User', 'u%d@example.com' % i, 'pw') for i in range(30)]
+        sleeps = []
+        monkeypatch.setattr('sharding.time.sleep', sleeps.append)
+        copy = sharding._copy_rows
+
+        def flaky_copy(source, target, user_id):
+            if user_id == ids[0]:
+                raise OSError('target down')
+            return copy(source, target, user_id)
+        monkeypatch.setattr('sharding._copy_rows', flaky_copy)
+
+        moves = [(user_id, next(n for n in servers if n != router.place(user_id)))
+                 for user_id in ids]
+        seen = []
+        moved, failed = move_users(router, moves, progress=lambda *a: seen.append(a))
+
+        assert sleeps == [60, 60]
+        assert list(failed) == [ids[0]] and len(moved) == 29
+        assert seen[-1] == (30, 30)
+        for user_id, target in moves:
+            shard = target if user_id in moved else router.place(user_id)
+            assert directory_row(directory, user_id)[2:] == (shard, 0)
+            assert user_id in users(servers[shard])
+            assert sum(user_id in users(s) for s in servers.values()) == 1
+
+    def test_rebalance_command(self, cluster, app, runner, fake_mysql):
+        """Test the CLI moves misplaced users in batches and reports progress."""
+        router, directory, servers = cluster
+        for i in range(20):
+            router.create_user('User', 'u%d@example.com' % i, 'pw')
+        servers['shard3'] = fake_mysql()
+        grown = ShardRouter({name: ConnectionPool(s.connect) for name, s in servers.items()},
+                            directory, cache_ttl=0)
+        app.extensions['shards'] = grown
+        count = len(misplaced_users(grown))
+        assert count > 2
+
+        result = runner.invoke(args=['shards', 'rebalance', '--batch-size', '2'])
+        assert result.exit_code == 0, result.output
+        assert '%d/%d users processed, 0 failed' % (count, count) in result.output
+        assert misplaced_users(grown) == []
+
+    def test_rebalance_resumes_interrupted_move(self, cluster, app, runner):
+        """Test a user left marked as moving is moved by the next rebalance."""
+        router, directory, servers = cluster
+        user_id = router.create_user('Ann', 'ann@example.com', 'pw')
+        home = router.place(user_id)
+        move_user(router, user_id, next(name for name in servers if name != home), wait=0)
+        directory.execute('UPDATE tbl_user_directory SET moving = 1 WHERE user_id = %s',
+                          (user_id,))
+        router.cache_ttl = 0
+        app.extensions['shards'] = router
+
+        assert [user_id for user_id, _ in misplaced_users(router)] == [user_id]
+        result = runner.invoke(args=['shards', 'rebalance'])
+        assert result.exit_code == 0, result.output
+        assert directory_row(directory, user_id)[2:] == (home, 0)
+        assert user_id in users(servers[home])
+
+    def test_repair_command(self, cluster, app, runner):
+        """Test repair makes users stuck as moving writable again."""
+        router, directory, _ = cluster
+        user_id = router.create_user('Ann', 'ann@example.com', 'pw')
+        directory.execute('UPDATE tbl_user_directory SET moving = 1 WHERE user_id = %s',
+                          (user_id,))
+        router.cache.invalidate(user_id)
+        app.extensions['shards'] = router
+
+        result = runner.invoke(args=['shards', 'repair'])
+        assert result.exit_code == 0, result.output
+        assert '1 users writable again' in result.output
+        router.connect(user_id, write=True).close()
+
+
+class TestBackfill:
+    """Test registering users created before sharding."""
+
+    @pytest.fixture
+    def legacy(self, cluster, app):
+        """Users 1-3 on shard0 and 4-5 on shard1, none in the directory."""
+        router, directory, servers = cluster
+        for shard, ids in (('shard0', (1, 2, 3)), ('shard1', (4, 5))):
+            servers[shard].executemany(
+                'INSERT INTO tbl_user VALUES (%s, %s, %s, %s)',
+                [(i, 'User', 'u%d@example.com' % i, 'pw') for i in ids])
+        app.extensions['shards'] = router
+        return cluster
+
+    def test_backfill_command(self, legacy, runner):
+        """Test every user is registered on the shard holding them, once."""
+        router, directory, _ = legacy
+        signup = router.create_user('Ann', 'ann@example.com', 'pw')
+
+        result = runner.invoke(args=['shards', 'backfill', '--batch-size', '2'])
+        assert result.exit_code == 0, result.output
+        assert '5 users added' in result.output
+        rows = directory.table('tbl_user_directory')
+        assert [rows[i][1:] for i in range(1, 6)] == [
+            ('u1@example.com', 'shard0', 0), ('u2@example.com', 'shard0', 0),
+            ('u3@example.com', 'shard0', 0), ('u4@example.com', 'shard1', 0),
+            ('u5@example.com', 'shard1', 0)]
+        assert sorted(rows) == [1, 2, 3, 4, 5, signup]
+        assert router.connect(4).server is legacy[2]['shard1']
+
+        result = runner.invoke(args=['shards', 'backfill'])
+        assert '0 users added' in result.output
+
+    def test_backfill_reports_duplicates(self, legacy, runner):
+        """Test a user found on two shards is reported, not registered."""
+        _, directory, servers = legacy
+        servers['shard2'].execute('INSERT INTO tbl_user VALUES (%s, %s, %s, %s)',
+                                  (5, 'User', 'u5@example.com', 'pw'))
+
+        result = runner.invoke(args=['shards', 'backfill'])
+        assert result.exit_code != 0
+        assert 'user 5 is on shard1, shard2' in result.output
+        assert sorted(directory.table('tbl_user_directory')) == [1, 2, 3, 4]
+
+
+class TestShardedRoutes:
+    """Test the routes with sharding enabled."""
+
+    @pytest.fixture
+    def sharded(self, app, cluster):
+        router = cluster[0]
+        app.extensions['shards'] = router
+        return cluster
+
+    def test_sign_up(self, client, sharded, sample_user_data):
+        """Test signUp registers through the directory."""
+        router, directory, _ = sharded
+        response = client.post('/signUp', data=sample_user_data)
+        assert response.get_json() == {'message': 'User created successfully !'}
+        response = client.post('/signUp', data=sample_user_data)
+        assert 'Username Exists' in response.get_json()['error']
+
+    def test_sign_up_shard_failure(self, client, sharded, sample_user_data):
+        """Test a failed shard insert is reported instead of a 500."""
+        router, directory, _ = sharded
+        for pool in router.shards.values():
+            pool._connect = MagicMock(side_effect=IntegrityError(1062, 'Duplicate entry'))
+        response = client.post('/signUp', data=sample_user_data)
+        assert response.status_code == 200
+        assert response.get_json() == {'error': 'Could not create the account, please try again'}
+        assert directory.table('tbl_user_directory') == {}
+
+    def test_login_unknown_user(self, client, sharded):
+        """Test an unknown username never reaches a shard."""
+        response = client.post('/validateLogin', data={'inputEmail': 'nobody@example.com',
+                                                       'inputPassword': 'pw'})
+        assert b'Wrong Email address or Password' in response.data
+
+    def test_add_wish_while_moving(self, client, sharded):
+        """Test addWish asks the user to retry during a move."""
+        router, directory, _ = sharded
+        user_id = router.create_user('Ann', 'ann@example.com', 'pw')
+        directory.execute('UPDATE tbl_user_directory SET moving = 1 WHERE user_id = %s',
+                          (user_id,))
+        router.cache.invalidate(user_id)
+        with client.session_transaction() as sess:
+            sess['user'] = user_id
+        response = client.post('/addWish', data={'inputTitle': 'T', 'inputDescription': 'D'})
+        assert b'being moved' in response.data
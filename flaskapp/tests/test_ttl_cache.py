@@ -0,0 +1,38 @@
+import pytest
+from unittest.mock import patch
+
+from fragment_cache import FragmentCache
+from ttl_cache import TTLCache
+
+
+class TestTTLCache:
+    """Test expiry, eviction and invalidation."""
+
+    def test_entries_expire(self):
+        """Test an entry is gone once its ttl has passed."""
+        cache = TTLCache(ttl=5)
+        with patch('ttl_cache.time.monotonic', return_value=100.0):
+            cache.set(1, 'a')
+        with patch('ttl_cache.time.monotonic', return_value=104.0):
+            assert cache.get(1) == 'a'
+        with patch('ttl_cache.time.monotonic', return_value=105.0):
+            assert cache.get(1) is None
+        assert cache.stats() == {'entries': 0, 'hits': 1, 'misses': 1}
+
+    def test_evicts_least_recently_used(self):
+        """Test a full cache drops the entry read longest ago."""
+        cache = TTLCache(maxsize=2)
+        cache.set(1, 'a')
+        cache.set(2, 'b')
+        cache.get(1)
+        cache.set(3, 'c')
+        assert [cache.get(key) for key in (1, 2, 3)] == ['a', None, 'c']
+
+    @pytest.mark.parametrize('cls, key', [(TTLCache, 7), (FragmentCache, (7, 'v1'))])
+    def test_invalidate(self, cls, key):
+        """Test invalidate() takes the key, or the user id for fragments."""
+        cache = cls()
+        cache.set(key, 'a')
+        cache.set(8 if cls is TTLCache else (8, 'v1'), 'b')
+        cache.invalidate(7)
+        assert cache.get(key) is None and len(cache.entries) == 1
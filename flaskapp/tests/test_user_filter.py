@@ -0,0 +1,262 @@
+import pytest
+import pymysql
+import time
+from unittest.mock import patch, MagicMock
+
+from user_filter import BloomFilter, UsernameFilter, normalize
+
+
+def add_users(db, *users):
+    """Insert ``(user_id, user_username)`` rows into tbl_user."""
+    db.executemany('INSERT INTO tbl_user (user_id, user_username) VALUES (%s, %s)', users)
+
+
+@pytest.fixture
+def db(fake_mysql):
+    """Fake database with two users in tbl_user."""
+    db = fake_mysql()
+    add_users(db, (1, 'alice@example.com'), (2, 'bob@example.com'))
+    return db
+
+
+@pytest.fixture
+def user_filter(app, db, monkeypatch):
+    """Enable a built username filter on the app, without the background thread."""
+    user_filter = UsernameFilter(db, refresh_interval=3600)
+    monkeypatch.setattr(user_filter, 'start', lambda app: None)
+    user_filter.rebuild()
+    user_filter.refresh()
+    app.extensions['user_filter'] = user_filter
+    app.config['USER_FILTER_ENABLED'] = True
+    return user_filter
+
+
+class TestBloomFilter:
+    """Test the Bloom filter data structure."""
+
+    def test_no_false_negatives(self):
+        """Test every added key is reported as present."""
+        bloom = BloomFilter(1000, 0.01)
+        keys = ['user%d@example.com' % i for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        assert all(key in bloom for key in keys)
+        assert len(bloom) == 1000
+
+    def test_false_positive_rate_near_target(self):
+        """Test the observed false-positive rate stays close to the target."""
+        bloom = BloomFilter(5000, 0.01)
+        for i in range(5000):
+            bloom.add('user%d@example.com' % i)
+        misses = sum('other%d@example.com' % i in bloom for i in range(20000))
+        assert misses / 20000 < 0.02
+        assert bloom.estimated_error_rate() < 0.02
+
+    def test_normalize_matches_collation(self):
+        """Test names MySQL compares as equal normalize identically."""
+        assert normalize('Alice@Example.com  ') == normalize('alice@example.com')
+        assert normalize('José') == normalize('jose')
+
+
+class TestUsernameFilter:
+    """Test building and syncing the username filter."""
+
+    def test_unbuilt_filter_fails_open(self):
+        """Test lookups answer maybe-present when the DB is unreachable."""
+        db = MagicMock()
+        db.connect.side_effect = Exception('Database connection failed')
+        user_filter = UsernameFilter(db)
+        user_filter.sync()
+        assert user_filter.might_exist('anyone@example.com')
+        assert user_filter.stats() == {'built': False}
+        # Failed builds are retried after the refresh interval
+        user_filter.sync()
+        assert db.connect.call_count == 1
+
+    def test_build_and_lookup(self, db):
+        """Test the filter is built from tbl_user and trusted after a refresh."""
+        user_filter = UsernameFilter(db, refresh_interval=3600)
+        user_filter.sync()
+        assert user_filter.might_exist('ALICE@example.com')
+        # Users committed during the rebuild are only caught by the refresh
+        assert user_filter.might_exist('mallory@example.com')
+        user_filter.refresh()
+        assert not user_filter.might_exist('mallory@example.com')
+        stats = user_filter.stats()
+        assert stats['built'] and stats['items'] == 2
+        assert stats['rebuild_seconds'] is not None
+
+    def test_refresh_picks_up_other_replicas(self, user_filter, db):
+        """Test users inserted elsewhere appear after a refresh."""
+        add_users(db, (3, 'carol@example.com'))
+        assert not user_filter.might_exist('carol@example.com')
+        user_filter.refresh()
+        assert user_filter.might_exist('carol@example.com')
+        assert user_filter.max_user_id == 3
+
+    def test_refresh_picks_up_late_commits(self, user_filter, db):
+        """Test a lower user_id that commits after a higher one is not skipped."""
+        db.execute('DELETE FROM tbl_user WHERE user_id = %s', (2,))
+        add_users(db, (3, 'carol@example.com'))
+        user_filter.rebuild()
+        user_filter.refresh()
+        add_users(db, (2, 'bob@example.com'))
+        user_filter.refresh()
+        assert user_filter.might_exist('bob@example.com')
+        count = len(user_filter.bloom)
+        user_filter.refresh()
+        assert len(user_filter.bloom) == count
+
+    def test_late_commit_beyond_many_rows(self, user_filter, db):
+        """Test the lookback counts rows, not ids, so sparse ids still work."""
+        db.execute('DELETE FROM tbl_user')
+        add_users(db, *[(i * 64 + 1, 'user%d@example.com' % i) for i in range(200) if i != 190])
+        user_filter.rebuild()
+        user_filter.refresh()
+        add_users(db, (190 * 64 + 1, 'late@example.com'))
+        user_filter.refresh()
+        assert user_filter.might_exist('late@example.com')
+        assert user_filter.max_user_id == 199 * 64 + 1
+
+    def test_lookups_never_touch_the_db(self, db):
+        """Test might_exist only reads the filter; syncing is left to the thread."""
+        db.connect = MagicMock(side_effect=AssertionError('queried on the request path'))
+        user_filter = UsernameFilter(db)
+        assert user_filter.might_exist('anyone@example.com')
+
+    def test_background_sync(self, app, db):
+        """Test start() builds the filter off the request path, once per process."""
+        user_filter = UsernameFilter(db, refresh_interval=0.05)
+        user_filter.start(app)
+        syncer = user_filter.syncer
+        user_filter.start(app)
+        assert user_filter.syncer is syncer
+        deadline = time.monotonic() + 5
+        while not user_filter.refreshed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not user_filter.might_exist('mallory@example.com')
+
+    def test_add_during_rebuild_is_kept(self, user_filter, db):
+        """Test signups recorded mid-rebuild survive the swap."""
+        original = db.streaming_cursor
+
+        def streaming_cursor(conn):
+            user_filter.add('dave@example.com')
+            return original(conn)
+
+        db.streaming_cursor = streaming_cursor
+        user_filter.rebuild()
+        assert user_filter.might_exist('dave@example.com')
+
+
+class TestUserFilterRoutes:
+    """Test the routes that consult the username filter."""
+
+    @patch('app.mysql.connect')
+    def test_login_unknown_user_skips_db(self, mock_connect, client, user_filter):
+        """Test a definite miss is rejected without touching MySQL."""
+        response = client.post('/validateLogin', data={
+            'inputEmail': 'mallory@example.com',
+            'inputPassword': 'password'
+        })
+        assert response.status_code == 200
+        assert b'Wrong Email address or Password' in response.data
+        mock_connect.assert_not_called()
+
+    @patch('app.mysql.connect')
+    def test_login_known_user_checks_db(self, mock_connect, client, user_filter):
+        """Test a possible hit still validates against MySQL."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [[1, 'Alice', 'alice@example.com', 'secret']]
+        mock_connect.return_value.cursor.return_value = mock_cursor
+
+        response = client.post('/validateLogin', data={
+            'inputEmail': 'alice@example.com',
+            'inputPassword': 'secret'
+        })
+        assert response.status_code == 302
+        mock_cursor.callproc.assert_called_with('sp_validateLogin', ('alice@example.com',))
+
+    @patch('app.mysql.connect')
+    def test_signup_new_user_skips_exists_check(self, mock_connect, client, user_filter):
+        """Test a definitely new username goes straight to the insert."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = []
+        mock_connect.return_value.cursor.return_value = mock_cursor
+
+        response = client.post('/signUp', data={
+            'inputName': 'Carol',
+            'inputEmail': 'carol@example.com',
+            'inputPassword': 'password'
+        })
+        assert response.get_json() == {'message': 'User created successfully !'}
+        mock_cursor.callproc.assert_called_with(
+            'sp_insertUser', ('Carol', 'carol@example.com', 'password'))
+        assert user_filter.might_exist('carol@example.com')
+
+    @patch('app.mysql.connect')
+    def test_signup_race_hits_unique_index(self, mock_connect, client, user_filter):
+        """Test a duplicate caught by the unique index is reported."""
+        mock_cursor = MagicMock()
+        mock_cursor.callproc.side_effect = pymysql.err.IntegrityError(1062, 'Duplicate entry')
+        mock_connect.return_value.cursor.return_value = mock_cursor
+
+        response = client.post('/signUp', data={
+            'inputName': 'Carol',
+            'inputEmail': 'carol@example.com',
+            'inputPassword': 'password'
+        })
+        assert 'Username Exists' in response.get_json()['error']
+        mock_connect.return_value.commit.assert_not_called()
+
+    @patch('app.mysql.connect')
+    def test_signup_without_insert_procedure(self, mock_connect, client, user_filter):
+        """Test a database missing sp_insertUser falls back to sp_createUser."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = []
+
+        def callproc(name, args):
+            if name == 'sp_insertUser':
+                raise pymysql.err.OperationalError(
+                    1305, 'PROCEDURE BucketList.sp_insertUser does not exist')
+        mock_cursor.callproc.side_effect = callproc
+        mock_connect.return_value.cursor.return_value = mock_cursor
+
+        response = client.post('/signUp', data={
+            'inputName': 'Carol',
+            'inputEmail': 'carol@example.com',
+            'inputPassword': 'password'
+        })
+        assert response.get_json() == {'message': 'User created successfully !'}
+        mock_cursor.callproc.assert_called_with(
+            'sp_createUser', ('Carol', 'carol@example.com', 'password'))
+
+    @patch('app.mysql.connect')
+    def test_signup_existing_user_uses_exists_check(self, mock_connect, client, user_filter):
+        """Test a possibly existing username goes through sp_createUser."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [('Username Exists !!',)]
+        mock_connect.return_value.cursor.return_value = mock_cursor
+
+        client.post('/signUp', data={
+            'inputName': 'Alice',
+            'inputEmail': 'alice@example.com',
+            'inputPassword': 'password'
+        })
+        mock_cursor.callproc.assert_called_with(
+            'sp_createUser', ('Alice', 'alice@example.com', 'password'))
+
+    def test_user_filter_stats(self, client, user_filter):
+        """Test the stats endpoint reports size, error rate and rebuild time."""
+        with client.session_transaction() as sess:
+            sess['user'] = 1
+        stats = client.get('/userFilterStats').get_json()
+        assert stats['built']
+        assert stats['size_bytes'] > 0
+        assert 0 <= stats['estimated_fp_rate'] < stats['target_fp_rate']
+        assert stats['rebuild_seconds'] >= 0
+
+    def test_user_filter_stats_unauthorized(self, client, user_filter):
+        """Test the stats endpoint requires a session."""
+        response = client.get('/userFilterStats')
+        assert b'Unauthorized Access' in response.data
@@ -0,0 +1,182 @@
+import pytest
+import json
+from unittest.mock import patch, MagicMock
+
+
+def wish_rows(count, start=1):
+    return [[i, 'Wish %d' % i, 'Description %d' % i, 1, '2023-01-01']
+            for i in range(start, start + count)]
+
+
+@pytest.fixture
+def ssr_app(app):
+    """Enable server-side rendering with a small page size."""
+    app.config['USERHOME_SSR'] = True
+    app.config['WISH_PAGE_SIZE'] = 3
+    return app
+
+
+@pytest.fixture
+def logged_in(ssr_app):
+    client = ssr_app.test_client()
+    with client.session_transaction() as sess:
+        sess['user'] = 1
+        sess['wish_version'] = 'v1'
+    return client
+
+
+class TestServerRenderedUserHome:
+    """Test the server-side rendered first page of userHome."""
+
+    @patch('app.mysql.connect')
+    def test_first_page_inlined(self, mock_connect, logged_in):
+        """Test the first page is rendered into the HTML."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = wish_rows(2)
+        mock_connect.return_value.cursor.return_value = mock_cursor
+
+        response = logged_in.get('/userHome')
+
+        assert response.status_code == 200
+        assert b'data-rendered="true"' in response.data
+        assert b'data-next-after=""' in response.data
+        assert b'Wish 1' in response.data and b'Description 2' in response.data
+        mock_cursor.callproc.assert_called_with('sp_GetWishByUserPage', (1, 0, 4))
+
+    @patch('app.mysql.connect')
+    def test_more_pages_marked(self, mock_connect, logged_in):
+        """Test a longer list renders one page and points at the next."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = wish_rows(4)
+        mock_connect.return_value.cursor.return_value = mock_cursor
+
+        response = logged_in.get('/userHome')
+
+        assert b'data-next-after="3"' in response.data
+        assert b'Wish 3' in response.data
+        assert b'Wish 4' not in response.data
+
+    @patch('app.mysql.connect')
+    def test_wishes_are_escaped(self, mock_connect, logged_in):
+        """Test wish text is HTML-escaped in the fragment."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [[1, '<script>x</script>', 'a & b', 1, None]]
+        mock_connect.return_value.cursor.return_value = mock_cursor
+
+        response = logged_in.get('/userHome')
+
+        assert b'<script>x</script>' not in response.data
+        assert b'&lt;script&gt;' in response.data
+        assert b'a &amp; b' in response.data
+
+    @patch('app.mysql.connect')
+    def test_fragment_cached(self, mock_connect, logged_in):
+        """Test repeat views are served from the fragment cache."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = wish_rows(2)
+        mock_connect.return_value.cursor.return_value = mock_cursor
+
+        first = logged_in.get('/userHome')
+        second = logged_in.get('/userHome')
+
+        assert first.data == second.data
+        assert mock_connect.call_count == 1
+
+    @patch('app.mysql.connect')
+    def test_add_wish_invalidates_fragment(self, mock_connect, logged_in, ssr_app):
+        """Test addWish drops the cached fragment and bumps the session version."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = wish_rows(2)
+        mock_connect.return_value.cursor.return_value = mock_cursor
+        logged_in.get('/userHome')
+
+        mock_cursor.fetchall.return_value = []
+        logged_in.post('/addWish', data={'inputTitle': 'Wish 3',
+                                         'inputDescription': 'Description 3'})
+        with logged_in.session_transaction() as sess:
+            assert sess['wish_version'] != 'v1'
+        assert ssr_app.extensions['wish_fragments'].get((1, 'v1')) is None
+
+        mock_cursor.fetchall.return_value = wish_rows(3)
+        response = logged_in.get('/userHome')
+        assert b'Wish 3' in response.data
+
+    @patch('app.mysql.connect')
+    def test_stale_replica_misses_after_version_change(self, mock_connect, logged_in, ssr_app):
+        """Test a fragment cached under an old session version is not served."""
+        ssr_app.extensions['wish_fragments'].set((1, 'v0'), ('<p>stale</p>', None))
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = wish_rows(1)
+        mock_connect.return_value.cursor.return_value = mock_cursor
+
+        response = logged_in.get('/userHome')
+
+        assert b'stale' not in response.data
+        assert b'Wish 1' in response.data
+
+    @patch('app.mysql.connect')
+    def test_db_error_falls_back_to_js(self, mock_connect, logged_in):
+        """Test the page still renders for getWish.js when MySQL fails."""
+        mock_connect.side_effect = Exception('Database connection failed')
+
+        response = logged_in.get('/userHome')
+
+        assert response.status_code == 200
+        assert b'data-rendered' not in response.data
+        assert b'getWish.js' in response.data
+
+    @patch('app.mysql.connect')
+    def test_ssr_disabled(self, mock_connect, client):
+        """Test userHome leaves the list to getWish.js when SSR is off."""
+        with client.session_transaction() as sess:
+            sess['user'] = 1
+
+        response = client.get('/userHome')
+
+        assert b'data-rendered' not in response.data
+        mock_connect.assert_not_called()
+
+
+class TestWishPages:
+    """Test the paged form of getWish used after the first page."""
+
+    @patch('app.mysql.connect')
+    def test_get_wish_page(self, mock_connect, logged_in):
+        """Test after/limit select one page of wishes."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = wish_rows(3, start=4)
+        mock_connect.return_value.cursor.return_value = mock_cursor
+
+        response = logged_in.get('/getWish?after=3&limit=3')
+
+        assert [w['Id'] for w in json.loads(response.data)] == [4, 5, 6]
+        mock_cursor.callproc.assert_called_with('sp_GetWishByUserPage', (1, 3, 3))
+        mock_connect.return_value.close.assert_called_once()
+
+    @patch('app.mysql.connect')
+    def test_get_wish_rest_of_list(self, mock_connect, logged_in):
+        """Test a missing limit returns every wish past ``after`` in one query."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = wish_rows(5, start=4)
+        mock_connect.return_value.cursor.return_value = mock_cursor
+
+        response = logged_in.get('/getWish?after=3')
+
+        assert [w['Id'] for w in json.loads(response.data)] == [4, 5, 6, 7, 8]
+        mock_cursor.callproc.assert_called_with('sp_GetWishByUserPage', (1, 3, 2 ** 31 - 1))
+
+    @patch('app.mysql.connect')
+    def test_rest_of_list_cached(self, mock_connect, logged_in, ssr_app):
+        """Test a repeat view gets the rest of the list without a query."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = wish_rows(2, start=4)
+        mock_connect.return_value.cursor.return_value = mock_cursor
+
+        first = logged_in.get('/getWish?after=3')
+        second = logged_in.get('/getWish?after=3')
+
+        assert first.data == second.data
+        assert mock_connect.call_count == 1
+        ssr_app.extensions['wish_fragments'].invalidate(1)
+        logged_in.get('/getWish?after=3')
+        assert mock_connect.call_count == 2
@@ -0,0 +1,200 @@
+import pytest
+import json
+from unittest.mock import patch, MagicMock
+
+from wish_feed import WishFeed
+
+
+def row(wish_id, user_id=1):
+    return (wish_id, 'Wish %d' % wish_id, 'Description %d' % wish_id, user_id, None)
+
+
+def add_wishes(db, *wish_ids):
+    db.executemany('INSERT INTO tbl_wish VALUES (%s, %s, %s, %s, %s)',
+                   [row(wish_id) for wish_id in wish_ids])
+
+
+@pytest.fixture
+def feed(app, monkeypatch):
+    """The app's wish feed with the background poller disabled."""
+    feed = app.extensions['wish_feed']
+    monkeypatch.setattr(feed, '_ensure_poller', lambda: None)
+    monkeypatch.setattr(feed, 'start', lambda: None)
+    return feed
+
+
+class TestWishFeed:
+    """Test dispatching tbl_wish rows to subscribers."""
+
+    def test_dispatch_to_owner_only(self, feed):
+        """Test rows reach only the owning user's subscribers."""
+        mine, other = feed.subscribe(1), feed.subscribe(2)
+        feed.dispatch(row(5, user_id=1))
+        assert mine.get(0) == row(5)
+        assert other.get(0) is None
+
+    def test_dispatch_once_per_wish(self, feed):
+        """Test a row seen twice (lookback, multiple polls) is sent once."""
+        sub = feed.subscribe(1)
+        feed.dispatch(row(5))
+        feed.dispatch(row(5))
+        assert sub.get(0) == row(5)
+        assert sub.get(0) is None
+
+    def test_fan_out_to_every_tab(self, feed):
+        """Test each connected client of a user gets the row."""
+        tabs = [feed.subscribe(1) for _ in range(3)]
+        feed.dispatch(row(7))
+        assert [tab.get(0) for tab in tabs] == [row(7)] * 3
+
+    def test_slow_subscriber_overflows(self, feed):
+        """Test a full queue marks the subscriber instead of blocking."""
+        feed.queue_size = 2
+        sub = feed.subscribe(1)
+        for wish_id in range(1, 4):
+            feed.dispatch(row(wish_id))
+        assert sub.overflowed
+
+    def test_unsubscribe(self, feed):
+        """Test the last unsubscribe removes the user entry."""
+        sub = feed.subscribe(1)
+        feed.unsubscribe(sub)
+        feed.unsubscribe(sub)
+        assert feed.subscribers == {}
+
+    def test_poll_starts_at_end_then_reads_new_rows(self, app, feed, fake_mysql):
+        """Test the first poll only records the end of the table."""
+        db = feed.db = fake_mysql()
+        add_wishes(db, 1, 2)
+        sub = feed.subscribe(1)
+
+        feed.poll()
+        assert feed.windows == {None: [1, 2]}
+        assert sub.get(0) is None
+
+        # A late commit with a lower id is still inside the lookback window
+        add_wishes(db, 4, 3)
+        feed.poll()
+        assert sorted([sub.get(0)[0], sub.get(0)[0]]) == [3, 4]
+        assert db.queries[-1][1] == (0,)
+        assert feed.windows == {None: [1, 2, 3, 4]}
+
+    def test_lookback_counts_rows_not_ids(self, app, feed, fake_mysql):
+        """Test late commits are found on a shard whose ids are 64 apart."""
+        feed.LOOKBACK = 3
+        db = feed.db = fake_mysql()
+        add_wishes(db, 2)
+        sub = feed.subscribe(1)
+
+        feed.poll()
+        add_wishes(db, 130, 194)
+        feed.poll()
+        # 66 was allocated before 130 but committed after 194 was seen
+        add_wishes(db, 66)
+        feed.poll()
+        assert [sub.get(0)[0] for _ in range(3)] == [130, 194, 66]
+        assert db.queries[-1][1] == (2,)
+        assert feed.windows == {None: [66, 130, 194]}
+
+    def test_subscribe_fixes_start_before_backlog(self, app, monkeypatch, fake_mysql):
+        """Test a wish committed between the backlog read and the first poll is sent."""
+        db = fake_mysql()
+        add_wishes(db, 1, 2)
+        feed = WishFeed(app, db)
+        monkeypatch.setattr(feed, '_ensure_poller', lambda: None)
+
+        with app.app_context():
+            sub = feed.subscribe(1)
+            assert feed.windows == {None: [1, 2]}
+            # Committed after the stream read its backlog
+            add_wishes(db, 3)
+            feed.poll()
+        assert sub.get(0) == row(3)
+
+    def test_poller_stops_when_idle(self, app):
+        """Test the poller exits and forgets its position with no subscribers."""
+        feed = WishFeed(app, MagicMock())
+        feed.windows = {None: [10]}
+        feed._run()
+        assert feed.poller is None and feed.windows == {}
+
+
+class TestWishStream:
+    """Test the /wishes/stream endpoint."""
+
+    def test_stream_unauthorized(self, client):
+        """Test the stream requires a session."""
+        response = client.get('/wishes/stream')
+        assert b'Unauthorized Access' in response.data
+
+    @patch('app.mysql.connect')
+    def test_stream_resumes_from_last_event_id(self, mock_connect, client, feed):
+        """Test a reconnect replays the backlog, then live wishes, without duplicates."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [row(4), row(5)]
+        mock_connect.return_value.cursor.return_value = mock_cursor
+        with client.session_transaction() as sess:
+            sess['user'] = 1
+
+        response = client.get('/wishes/stream', headers={'Last-Event-ID': '3'},
+                              buffered=False)
+        assert response.mimetype == 'text/event-stream'
+        mock_cursor.callproc.assert_called_with('sp_GetWishByUserPage', (1, 3, 1000))
+
+        chunks = response.iter_encoded()
+        assert next(chunks) == b'retry: 3000\n\n'
+        assert next(chunks).startswith(b'id: 4\nevent: wish\ndata: ')
+        assert next(chunks).startswith(b'id: 5\n')
+
+        feed.dispatch(row(5))
+        feed.dispatch(row(6))
+        event = next(chunks).decode()
+        assert event.startswith('id: 6\n')
+        assert json.loads(event.split('data: ')[1])['Title'] == 'Wish 6'
+
+        response.close()
+        assert feed.subscribers == {}
+
+    @patch('app.mysql.connect')
+    def test_capped_backlog_ends_stream(self, mock_connect, app, client, feed):
+        """Test a full backlog ends the stream so the client resumes after it."""
+        app.config['WISH_STREAM_BACKLOG'] = 2
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [row(4), row(5)]
+        mock_connect.return_value.cursor.return_value = mock_cursor
+        with client.session_transaction() as sess:
+            sess['user'] = 1
+
+        response = client.get('/wishes/stream?lastEventId=3', buffered=False)
+        mock_cursor.callproc.assert_called_with('sp_GetWishByUserPage', (1, 3, 2))
+
+        chunks = list(response.iter_encoded())
+        assert chunks[0] == b'retry: 3000\n\n'
+        assert [chunk.split(b'\n')[0] for chunk in chunks[1:3]] == [b'id: 4', b'id: 5']
+        assert chunks[3:] == [b'retry: 0\n\n']
+        response.close()
+        assert feed.subscribers == {}
+
+    def test_stream_query_param_and_heartbeat(self, app, client, feed):
+        """Test a fresh stream with nothing new only sends keep-alives."""
+        app.config['WISH_STREAM_HEARTBEAT_SECONDS'] = 0.01
+        with client.session_transaction() as sess:
+            sess['user'] = 1
+
+        response = client.get('/wishes/stream', buffered=False)
+        chunks = response.iter_encoded()
+        assert next(chunks) == b'retry: 3000\n\n'
+        assert next(chunks) == b': keep-alive\n\n'
+        response.close()
+
+    @patch('app.mysql.connect')
+    def test_add_wish_wakes_feed(self, mock_connect, client, feed):
+        """Test addWish asks the poller to look for the new row right away."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = []
+        mock_connect.return_value.cursor.return_value = mock_cursor
+        with client.session_transaction() as sess:
+            sess['user'] = 1
+
+        client.post('/addWish', data={'inputTitle': 'Wish', 'inputDescription': 'Desc'})
+        assert feed.wake.is_set()
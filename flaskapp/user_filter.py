@@ -0,0 +1,278 @@
+"""
+In-process Bloom filter of registered usernames.
+
+validateLogin uses it to turn away logins for usernames that were never
+registered without a round trip to MySQL, and signUp uses it to skip the
+existence check in sp_createUser for names that are definitely new. The
+filter can only answer "definitely absent" or "maybe present"; the
+unique index on tbl_user.user_username remains the source of truth.
+
+Every worker builds its own filter by streaming tbl_user, then keeps it
+in step with signups made on other replicas by periodically pulling the
+rows added since the highest user_id it has seen. A full rebuild runs on
+a longer interval to resize the filter and drop deleted users. All of
+this happens in a background thread; requests only read the filter.
+
+Auto-increment ids are allocated before commit, so a user can become
+visible after a higher id already was. Like the wish feed, each refresh
+re-reads from the lowest of the last LOOKBACK ids seen, and until the
+first refresh after a rebuild has caught such late rows, a miss is not
+trusted.
+"""
+
+import bisect
+import hashlib
+import heapq
+import logging
+import math
+import os
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(username):
+    """Fold a username the way the tbl_user collation compares it.
+
+    tbl_user uses a case- and accent-insensitive collation that ignores
+    trailing spaces, so two names MySQL treats as equal must hash the
+    same here. Folding too much only adds false positives, never misses.
+    """
+    decomposed = unicodedata.normalize('NFKD', username.rstrip(' '))
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return stripped.casefold()
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter sized for ``capacity`` keys."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(int(capacity), 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(
+            -capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def size_bytes(self):
+        return len(self.bits)
+
+    def estimated_error_rate(self):
+        """False-positive rate implied by the fraction of bits set."""
+        bits_set = bin(int.from_bytes(self.bits, 'little')).count('1')
+        return (bits_set / self.num_bits) ** self.num_hashes
+
+
+class UsernameFilter:
+    """Bloom filter of tbl_user.user_username kept in sync with MySQL.
+
+    ``db`` provides ``connect()`` and ``streaming_cursor(conn)`` like
+    db.MySQL, so syncing must run inside an app context. ``table`` is
+    tbl_user_directory when users are sharded. Until a build and the
+    refresh after it succeed every lookup answers "maybe present", so a
+    database outage never locks users out.
+    """
+
+    FETCH_SIZE = 10000
+    LOOKBACK = 50
+
+    def __init__(self, db, error_rate=0.01, refresh_interval=5.0,
+                 rebuild_interval=3600.0, min_capacity=1024, table='tbl_user'):
+        self.db = db
+        self.table = table
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.min_capacity = min_capacity
+        self.bloom = None
+        self.pending = None
+        self.max_user_id = 0
+        self.recent_ids = []
+        self.refreshed = False
+        self.last_refresh = 0.0
+        self.last_rebuild = 0.0
+        self.rebuild_seconds = None
+        self.retry_at = 0.0
+        self.syncer = None
+        self.syncer_pid = None
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+
+    def rebuild(self):
+        """Stream every username from tbl_user into a freshly sized filter."""
+        started = time.monotonic()
+        conn = self.db.connect()
+        with self.lock:
+            self.pending = []
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM %s' % self.table)
+            total = cursor.fetchone()[0]
+            cursor.close()
+
+            bloom = BloomFilter(max(2 * total, self.min_capacity), self.error_rate)
+            recent_ids = []
+            cursor = self.db.streaming_cursor(conn)
+            cursor.execute('SELECT user_id, user_username FROM %s' % self.table)
+            rows = cursor.fetchmany(self.FETCH_SIZE)
+            while rows:
+                for user_id, username in rows:
+                    if username is not None:
+                        bloom.add(normalize(username))
+                    if len(recent_ids) < self.LOOKBACK:
+                        heapq.heappush(recent_ids, user_id)
+                    elif user_id > recent_ids[0]:
+                        heapq.heapreplace(recent_ids, user_id)
+                rows = cursor.fetchmany(self.FETCH_SIZE)
+            cursor.close()
+        except Exception:
+            with self.lock:
+                self.pending = None
+            raise
+        finally:
+            conn.close()
+
+        finished = time.monotonic()
+        with self.lock:
+            # Signups made on this replica while streaming may be missing
+            # from the snapshot; carry them over.
+            for key in self.pending:
+                bloom.add(key)
+            self.pending = None
+            self.bloom = bloom
+            self.recent_ids = sorted(recent_ids)
+            self.max_user_id = self.recent_ids[-1] if recent_ids else 0
+            self.refreshed = False
+            self.last_refresh = self.last_rebuild = finished
+            self.rebuild_seconds = finished - started
+
+    def refresh(self):
+        """Add the users other replicas created since the last refresh."""
+        recent_ids = self.recent_ids
+        # Every id seen above the floor is in recent_ids, so anything
+        # else the query returns committed late or is new.
+        floor = recent_ids[0] if len(recent_ids) >= self.LOOKBACK else 0
+        conn = self.db.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT user_id, user_username FROM %s '
+                'WHERE user_id > %%s ORDER BY user_id' % self.table, (floor,))
+            rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+
+        with self.lock:
+            recent_ids = list(self.recent_ids)
+            for user_id, username in rows:
+                i = bisect.bisect_left(recent_ids, user_id)
+                if i < len(recent_ids) and recent_ids[i] == user_id:
+                    continue
+                if username is not None:
+                    self.bloom.add(normalize(username))
+                recent_ids.insert(i, user_id)
+            self.recent_ids = recent_ids[-self.LOOKBACK:]
+            self.max_user_id = recent_ids[-1] if recent_ids else 0
+            self.refreshed = True
+            self.last_refresh = time.monotonic()
+
+    def sync(self):
+        """Rebuild or refresh the filter when its interval has elapsed.
+
+        Only one thread syncs at a time; the others keep using the
+        current filter. Failures are logged and retried after
+        ``refresh_interval``, and a filter that was never built keeps
+        answering "maybe present".
+        """
+        now = time.monotonic()
+        if now < self.retry_at or not self.sync_lock.acquire(blocking=False):
+            return
+        try:
+            bloom = self.bloom
+            if (bloom is None
+                    or now - self.last_rebuild >= self.rebuild_interval
+                    or len(bloom) > bloom.capacity):
+                self.rebuild()
+            elif now - self.last_refresh >= self.refresh_interval:
+                self.refresh()
+        except Exception:
+            logger.warning('username filter sync failed', exc_info=True)
+            self.retry_at = now + self.refresh_interval
+        finally:
+            self.sync_lock.release()
+
+    def start(self, app):
+        """Keep the filter synced from a background thread of this process.
+
+        Cheap to call on every request. The pid check starts the thread
+        again in a forked worker, where the parent's thread does not exist.
+        """
+        with self.lock:
+            if self.syncer is None or self.syncer_pid != os.getpid():
+                self.syncer = threading.Thread(target=self._run, args=(app,),
+                                               name='user-filter', daemon=True)
+                self.syncer_pid = os.getpid()
+                self.syncer.start()
+
+    def _run(self, app):
+        with app.app_context():
+            while True:
+                self.sync()
+                time.sleep(self.refresh_interval)
+
+    def might_exist(self, username):
+        """False only when ``username`` is certainly not registered."""
+        bloom = self.bloom
+        if bloom is None or not self.refreshed:
+            return True
+        return normalize(username) in bloom
+
+    def add(self, username):
+        """Record a username created by this replica."""
+        key = normalize(username)
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(key)
+            if self.pending is not None:
+                self.pending.append(key)
+
+    def stats(self):
+        bloom = self.bloom
+        if bloom is None:
+            return {'built': False}
+        return {
+            'built': True,
+            'items': len(bloom),
+            'capacity': bloom.capacity,
+            'size_bytes': bloom.size_bytes,
+            'hashes': bloom.num_hashes,
+            'target_fp_rate': bloom.error_rate,
+            'estimated_fp_rate': bloom.estimated_error_rate(),
+            'rebuild_seconds': self.rebuild_seconds,
+            'seconds_since_rebuild': time.monotonic() - self.last_rebuild,
+            'seconds_since_refresh': time.monotonic() - self.last_refresh,
+        }
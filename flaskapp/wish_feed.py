@@ -0,0 +1,199 @@
+"""
+Fan-out of new wishes to /wishes/stream subscribers.
+
+tbl_wish itself is the pub/sub channel. Each worker runs one poller that
+reads the wishes added since the last poll, from any replica, and hands
+them to the local subscribers of the owning user. One query per poll
+interval serves every connected client of that worker. The poller only
+runs while the worker has subscribers.
+
+With sharding enabled the poller reads every shard, keeping a separate
+position in each since every shard allocates its own ids.
+
+Auto-increment ids are allocated before commit, so a wish can become
+visible after a higher id already was. Each poll therefore re-reads
+from the lowest of the last LOOKBACK ids seen, and rows already
+dispatched are skipped. The window counts rows rather than ids because
+shards hand out ids auto_increment_increment apart.
+
+Waiting is done with queue/threading primitives, which gevent patches,
+so under a gevent worker an idle stream costs a greenlet, not a thread.
+"""
+
+import bisect
+import logging
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """A bounded queue of tbl_wish rows for one connected client."""
+
+    def __init__(self, user_id, maxsize):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, row):
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            # The client fell behind; close its stream so it reconnects
+            # and catches up from its Last-Event-ID.
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Next row, or None if nothing arrived within ``timeout`` seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class WishFeed:
+    """Polls tbl_wish and dispatches new rows to local subscribers."""
+
+    LOOKBACK = 50
+    RECENT_SIZE = 10000
+
+    def __init__(self, app, db, poll_interval=1.0, queue_size=100):
+        self.app = app
+        self.db = db
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.subscribers = {}
+        self.recent = OrderedDict()
+        self.windows = {}
+        self.poller = None
+        self.poller_pid = None
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        sub = Subscription(user_id, self.queue_size)
+        with self.lock:
+            self.subscribers.setdefault(user_id, set()).add(sub)
+            self._ensure_poller()
+        # Fix the starting position before the caller reads its backlog:
+        # a wish committed in between must be dispatched, not taken for
+        # one the backlog already had.
+        self.start()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            subs = self.subscribers.get(sub.user_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self.subscribers[sub.user_id]
+
+    def notify(self):
+        """Poll now instead of waiting for the interval, e.g. after addWish."""
+        self.wake.set()
+
+    def dispatch(self, row):
+        """Hand a tbl_wish row to its user's subscribers, once per wish_id."""
+        with self.lock:
+            if row[0] in self.recent:
+                return
+            self._remember(row[0])
+            subs = list(self.subscribers.get(row[3], ()))
+        for sub in subs:
+            sub.put(row)
+
+    def _remember(self, wish_id):
+        # Called with the lock held
+        self.recent[wish_id] = None
+        if len(self.recent) > self.RECENT_SIZE:
+            self.recent.popitem(last=False)
+
+    def sources(self):
+        """``(name, connect)`` for every database holding tbl_wish rows."""
+        router = self.app.extensions.get('shards')
+        if router is None:
+            return [(None, self.db.connect)]
+        return [(name, shard.connect) for name, shard in router.shards.items()]
+
+    def start(self):
+        """Record the current end of every source that has no position yet."""
+        for name, connect in self.sources():
+            if name not in self.windows:
+                try:
+                    self._start_source(name, connect)
+                except Exception:
+                    logger.warning('wish feed could not start', exc_info=True)
+
+    def poll(self):
+        for name, connect in self.sources():
+            if name not in self.windows:
+                self._start_source(name, connect)
+            else:
+                self._poll_source(name, connect)
+
+    def _start_source(self, name, connect):
+        # Subscribers catch up on anything older through Last-Event-ID.
+        # Rows already inside the lookback window are not news.
+        conn = connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT wish_id FROM tbl_wish ORDER BY wish_id DESC LIMIT %s',
+                (self.LOOKBACK,))
+            window = sorted(wish_id for (wish_id,) in cursor.fetchall())
+            cursor.close()
+        finally:
+            conn.close()
+        with self.lock:
+            for wish_id in window:
+                self._remember(wish_id)
+        self.windows.setdefault(name, window)
+
+    def _poll_source(self, name, connect):
+        window = list(self.windows[name])
+        # Every id seen above the floor is in the window
+        floor = window[0] if len(window) >= self.LOOKBACK else 0
+        conn = connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT * FROM tbl_wish WHERE wish_id > %s ORDER BY wish_id', (floor,))
+            rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+
+        for row in rows:
+            self.dispatch(row)
+            i = bisect.bisect_left(window, row[0])
+            if i == len(window) or window[i] != row[0]:
+                window.insert(i, row[0])
+        self.windows[name] = window[-self.LOOKBACK:]
+
+    def _ensure_poller(self):
+        # Called with the lock held. The pid check restarts the poller in
+        # a forked worker, where the parent's thread does not exist.
+        if self.poller is None or self.poller_pid != os.getpid():
+            self.poller = threading.Thread(target=self._run, name='wish-feed',
+                                           daemon=True)
+            self.poller_pid = os.getpid()
+            self.poller.start()
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                with self.lock:
+                    if not self.subscribers:
+                        self.poller = None
+                        self.windows = {}
+                        return
+                try:
+                    self.poll()
+                except Exception:
+                    logger.warning('wish feed poll failed', exc_info=True)
+                self.wake.wait(self.poll_interval)
+                self.wake.clear()
@@ -0,0 +1,218 @@
+from dataclasses import dataclass
+from datetime import datetime
+from flask import (Blueprint, Response, current_app, jsonify, redirect, render_template,
+                   request, session)
+from markupsafe import Markup
+import uuid
+
+from sharding import connect_for_user
+
+bp = Blueprint('wishes', __name__)
+
+
+@dataclass
+class Wish:
+    """A tbl_wish row as returned to the client by /getWish."""
+    __slots__ = ('Id', 'Title', 'Description', 'Date')
+    Id: int
+    Title: str
+    Description: str
+    Date: datetime
+
+    @classmethod
+    def from_row(cls, row):
+        # tbl_wish: wish_id, wish_title, wish_description, wish_user_id, wish_date
+        return cls(row[0], row[1], row[2], row[4])
+
+
+# p_limit of sp_GetWishByUserPage is an INT
+_NO_LIMIT = 2 ** 31 - 1
+
+
+def _fetch_wishes(user, after=None, limit=None):
+    """Return the user's wishes past id ``after``, at most ``limit`` of them."""
+    con = connect_for_user(user)
+    try:
+        cursor = con.cursor()
+        if after is None and limit is None:
+            cursor.callproc('sp_GetWishByUser',(user,))
+        else:
+            if limit is None:
+                limit = _NO_LIMIT
+            cursor.callproc('sp_GetWishByUserPage',(user,after or 0,limit))
+        wishes = [Wish.from_row(wish) for wish in cursor.fetchall()]
+        cursor.close()
+        return wishes
+    finally:
+        con.close()
+
+
+def _first_page(user):
+    """Rendered first page of the user's wishes and the id to continue after.
+
+    Served from the fragment cache while the session's wish_version is
+    unchanged. The id is None when the whole list fits on the page.
+    """
+    cache = current_app.extensions['wish_fragments']
+    key = (user, session.get('wish_version'))
+    page = cache.get(key)
+    if page is None:
+        page_size = current_app.config['WISH_PAGE_SIZE']
+        wishes = _fetch_wishes(user, limit=page_size + 1)
+        next_after = wishes[page_size - 1].Id if len(wishes) > page_size else None
+        html = render_template('wishList.html', wishes=wishes[:page_size])
+        page = (html, next_after)
+        cache.set(key, page)
+    return page
+
+
+def _rest_of_list(user, after):
+    """The user's wishes past the server-rendered first page.
+
+    getWish.js fetches these in one request after userHome; like the
+    first page they are cached while the session's wish_version is
+    unchanged, so a repeat view runs no queries.
+    """
+    cache = current_app.extensions['wish_fragments']
+    key = (user, session.get('wish_version'), after)
+    wishes = cache.get(key)
+    if wishes is None:
+        wishes = _fetch_wishes(user, after)
+        cache.set(key, wishes)
+    return wishes
+
+
+@bp.route('/userHome')
+def userHome():
+    if session.get('user'):
+        if current_app.config['USERHOME_SSR']:
+            try:
+                html, next_after = _first_page(session.get('user'))
+            except Exception:
+                # Leave the list to getWish.js
+                current_app.logger.warning('could not render wishes', exc_info=True)
+            else:
+                return render_template('userHome.html', wishes_html=Markup(html),
+                                       next_after=next_after)
+        return render_template('userHome.html')
+    else:
+        return render_template('error.html',error = 'Unauthorized Access')
+
+@bp.route('/showAddWish')
+def showAddWish():
+    return render_template('addWish.html')
+
+@bp.route('/addWish',methods=['POST'])
+def addWish():
+    conn = cursor = None
+    try:
+        if session.get('user'):
+            _title = request.form['inputTitle']
+            _description = request.form['inputDescription']
+            _user = session.get('user')
+ 
+            conn = connect_for_user(_user, write=True)
+            cursor = conn.cursor()
+            cursor.callproc('sp_addWish',(_title,_description,_user))
+            data = cursor.fetchall()
+ 
+            if len(data) == 0:
+                conn.commit()
+                # The new wish must show up on the next userHome, whichever
+                # replica serves it
+                session['wish_version'] = uuid.uuid4().hex
+                current_app.extensions['wish_fragments'].invalidate(_user)
+                current_app.extensions['wish_feed'].notify()
+                return redirect('/userHome')
+            else:
+                return render_template('error.html',error = 'An error occurred!')
+ 
+        else:
+            return render_template('error.html',error = 'Unauthorized Access')
+    except Exception as e:
+        return render_template('error.html',error = str(e))
+    finally:
+        if cursor is not None:
+            cursor.close()
+        if conn is not None:
+            conn.close()
+
+@bp.route('/getWish')
+def getWish():
+    try:
+        if session.get('user'):
+            _user = session.get('user')
+            _after = request.args.get('after', type=int)
+            _limit = request.args.get('limit', type=int)
+
+            if _after is None and _limit is None:
+                return jsonify(_fetch_wishes(_user))
+            if _limit is None:
+                return jsonify(_rest_of_list(_user, _after))
+            return jsonify(_fetch_wishes(_user, _after, max(1, _limit)))
+        else:
+            return render_template('error.html', error = 'Unauthorized Access')
+    except Exception as e:
+        return render_template('error.html', error = str(e))
+
+
+@bp.route('/wishes/stream')
+def streamWishes():
+    """Server-Sent Events stream of the wishes added after the client's last one.
+
+    The client's position comes from the Last-Event-ID header that
+    EventSource sends on reconnect, or from ?lastEventId= on the first
+    connection. Without either, only wishes added from now on are sent.
+    A backlog cut at WISH_STREAM_BACKLOG ends the stream right after it,
+    so EventSource reconnects at once and reads on from the last id.
+    """
+    if not session.get('user'):
+        return render_template('error.html', error = 'Unauthorized Access')
+
+    _user = session.get('user')
+    _last = request.headers.get('Last-Event-ID', type=int)
+    if _last is None:
+        _last = request.args.get('lastEventId', type=int)
+
+    feed = current_app.extensions['wish_feed']
+    dumps = current_app.json.dumps
+    heartbeat = current_app.config['WISH_STREAM_HEARTBEAT_SECONDS']
+
+    # Subscribe before reading the backlog so nothing added in between is lost
+    sub = feed.subscribe(_user)
+    try:
+        backlog = []
+        backlog_size = current_app.config['WISH_STREAM_BACKLOG']
+        if _last is not None:
+            backlog = _fetch_wishes(_user, _last, backlog_size)
+    except Exception:
+        feed.unsubscribe(sub)
+        raise
+    capped = bool(backlog) and len(backlog) == backlog_size
+
+    def event(wish):
+        return 'id: %d\nevent: wish\ndata: %s\n\n' % (wish.Id, dumps(wish))
+
+    def events():
+        yield 'retry: 3000\n\n'
+        seen = set()
+        for wish in backlog:
+            seen.add(wish.Id)
+            yield event(wish)
+        if capped:
+            # There may be more: reconnect without the usual delay
+            yield 'retry: 0\n\n'
+            return
+        while not sub.overflowed:
+            row = sub.get(heartbeat)
+            if row is None:
+                yield ': keep-alive\n\n'
+            elif row[0] not in seen:
+                yield event(Wish.from_row(row))
+
+    response = Response(events(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache',
+                                 'X-Accel-Buffering': 'no'})
+    # Runs on disconnect too, even if the stream was never started
+    response.call_on_close(lambda: feed.unsubscribe(sub))
+    return response
@@ -8,13 +8,17 @@ CREATE TABLE `BucketList`.`tbl_user` (
   `user_name` VARCHAR(45) NULL,
   `user_username` VARCHAR(45) NULL,
   `user_password` VARCHAR(45) NULL,
-  PRIMARY KEY (`user_id`));
+  PRIMARY KEY (`user_id`),
+  UNIQUE KEY `uq_user_username` (`user_username`));
 
 USE BucketList;
 
+-- Demo user, only on unsharded databases. Shards are started with an
+-- auto_increment_increment above 1 and get their users through
+-- tbl_user_directory, whose ids would collide with a copy on every shard.
 INSERT INTO tbl_user
-values
-(10,'ahmed','ahmed','ahmed');
+SELECT 10,'ahmed','ahmed','ahmed' FROM DUAL
+WHERE @@auto_increment_increment = 1;
 
 
 DELIMITER $$
@@ -47,6 +51,30 @@ BEGIN
 END$$
 DELIMITER ;
 
+DELIMITER $$
+CREATE DEFINER=`root`@`localhost` PROCEDURE `sp_insertUser`(
+    IN p_name VARCHAR(20),
+    IN p_username VARCHAR(100),
+    IN p_password VARCHAR(20)
+)
+BEGIN
+    -- Used when the app already knows the username is new; the unique
+    -- index on user_username rejects duplicates.
+    insert into tbl_user
+    (
+        user_name,
+        user_username,
+        user_password
+    )
+    values
+    (
+        p_name,
+        p_username,
+        p_password
+    );
+END$$
+DELIMITER ;
+
 DELIMITER $$
 CREATE DEFINER=`root`@`localhost` PROCEDURE `sp_validateLogin`(
 IN p_username VARCHAR(20)
@@ -63,10 +91,25 @@ CREATE TABLE `BucketList`.`tbl_wish` (
   `wish_description` varchar(5000) DEFAULT NULL,
   `wish_user_id` int(11) DEFAULT NULL,
   `wish_date` datetime DEFAULT NULL,
-  PRIMARY KEY (`wish_id`)
+  PRIMARY KEY (`wish_id`),
+  KEY `idx_wish_user` (`wish_user_id`, `wish_id`)
 ) ENGINE=InnoDB AUTO_INCREMENT=3 DEFAULT CHARSET=latin1;
 
 
+-- Username -> shard directory, only used on the primary database when
+-- the app runs with MYSQL_SHARDS. Its user_id is the global id that the
+-- user's tbl_user row on their shard is created with.
+CREATE TABLE `BucketList`.`tbl_user_directory` (
+  `user_id` BIGINT NOT NULL AUTO_INCREMENT,
+  `user_username` VARCHAR(45) NOT NULL,
+  `shard` VARCHAR(64) NOT NULL,
+  `moving` TINYINT(1) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`user_id`),
+  UNIQUE KEY `uq_directory_username` (`user_username`))
+-- Above any user_id created before the database was sharded
+AUTO_INCREMENT=1000;
+
+
 USE `BucketList`;
 DROP procedure IF EXISTS `BucketList`.`sp_addWish`;
 DELIMITER $$
@@ -104,4 +147,21 @@ IN p_user_id bigint
 BEGIN
     select * from tbl_wish where wish_user_id = p_user_id;
 END$$
-DELIMITER ;
\ No newline at end of file
+DELIMITER ;
+
+USE `BucketList`;
+DROP procedure IF EXISTS `sp_GetWishByUserPage`;
+DELIMITER $$
+USE `BucketList`$$
+CREATE PROCEDURE `sp_GetWishByUserPage` (
+IN p_user_id bigint,
+IN p_after_id int,
+IN p_limit int
+)
+BEGIN
+    select * from tbl_wish
+    where wish_user_id = p_user_id and wish_id > p_after_id
+    order by wish_id
+    limit p_limit;
+END$$
+DELIMITER ;
@@ -0,0 +1,93 @@
+-- Upgrade an existing BucketList database to the current schema.
+--
+-- BucketList.sql only runs when a database volume is first initialised,
+-- so databases created before these objects were added need this
+-- script. It is safe to run more than once:
+--
+--   mysql -uroot -p BucketList < mysql/upgrade.sql
+
+USE `BucketList`;
+
+DROP PROCEDURE IF EXISTS `upgrade_add_index`;
+DELIMITER $$
+CREATE PROCEDURE `upgrade_add_index`(
+    IN p_table VARCHAR(64),
+    IN p_index VARCHAR(64),
+    IN p_definition VARCHAR(255)
+)
+BEGIN
+    if not ( select exists (select 1 from information_schema.statistics
+                            where table_schema = database()
+                              and table_name = p_table
+                              and index_name = p_index) ) THEN
+        set @ddl = concat('ALTER TABLE `', p_table, '` ADD ', p_definition);
+        prepare stmt from @ddl;
+        execute stmt;
+        deallocate prepare stmt;
+    END IF;
+END$$
+DELIMITER ;
+
+-- Username filter: signUp inserts definitely new names directly and
+-- relies on the unique index. Fails if duplicate usernames exist; remove
+-- them first.
+CALL upgrade_add_index('tbl_user', 'uq_user_username',
+                       'UNIQUE KEY `uq_user_username` (`user_username`)');
+
+DROP PROCEDURE IF EXISTS `sp_insertUser`;
+DELIMITER $$
+CREATE DEFINER=`root`@`localhost` PROCEDURE `sp_insertUser`(
+    IN p_name VARCHAR(20),
+    IN p_username VARCHAR(100),
+    IN p_password VARCHAR(20)
+)
+BEGIN
+    -- Used when the app already knows the username is new; the unique
+    -- index on user_username rejects duplicates.
+    insert into tbl_user
+    (
+        user_name,
+        user_username,
+        user_password
+    )
+    values
+    (
+        p_name,
+        p_username,
+        p_password
+    );
+END$$
+DELIMITER ;
+
+-- Sharding: username -> shard directory on the primary database.
+-- Register existing users with `flask shards backfill` after setting
+-- MYSQL_SHARDS, before the app takes signups.
+CREATE TABLE IF NOT EXISTS `tbl_user_directory` (
+  `user_id` BIGINT NOT NULL AUTO_INCREMENT,
+  `user_username` VARCHAR(45) NOT NULL,
+  `shard` VARCHAR(64) NOT NULL,
+  `moving` TINYINT(1) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`user_id`),
+  UNIQUE KEY `uq_directory_username` (`user_username`))
+AUTO_INCREMENT=1000;
+
+-- Paged wish lists: one index range scan per page instead of a full scan.
+CALL upgrade_add_index('tbl_wish', 'idx_wish_user',
+                       'KEY `idx_wish_user` (`wish_user_id`, `wish_id`)');
+
+DROP PROCEDURE IF EXISTS `sp_GetWishByUserPage`;
+DELIMITER $$
+CREATE PROCEDURE `sp_GetWishByUserPage` (
+IN p_user_id bigint,
+IN p_after_id int,
+IN p_limit int
+)
+BEGIN
+    select * from tbl_wish
+    where wish_user_id = p_user_id and wish_id > p_after_id
+    order by wish_id
+    limit p_limit;
+END$$
+DELIMITER ;
+
+DROP PROCEDURE IF EXISTS `upgrade_add_index`;